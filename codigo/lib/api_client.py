@@ -144,36 +144,70 @@ class ImageTextExtractorAPI:
                 logger.warning(f"Error verificando imagen {os.path.basename(image_path)}: {img_err}")
                 # Intentaremos procesar de todos modos
             
-            # Crear modelo y enviar la solicitud
-            logger.debug(f"Enviando imagen {os.path.basename(image_path)} a Gemini API")
-            model = genai.GenerativeModel(self.model_name)
-            
             # Abrir imagen para enviarla a la API
             img = Image.open(image_path)
-            
-            # Enviar solicitud a la API con timeout generoso
-            response = model.generate_content([self.prompt, img], request_options={'timeout': 180})
-            
-            # Procesar respuesta
-            if response.parts:
-                if hasattr(response, 'text') and response.text:
-                    result["extracted_text"] = response.text.strip()
-                    logger.info(f"Texto extraído de {os.path.basename(image_path)} ({len(result['extracted_text'])} chars).")
-                else:
-                    logger.warning(f"Respuesta sin texto para {os.path.basename(image_path)}")
-                    result["error"] = "No text in response"
-            else:
-                reason = "Razón desconocida"
-                try:
-                    if response.prompt_feedback and response.prompt_feedback.block_reason:
-                        reason = f"Bloqueado por: {response.prompt_feedback.block_reason}"
-                except Exception:
-                    pass
-                logger.warning(f"Respuesta sin partes de texto. {reason}")
-                result["error"] = f"No parts in response: {reason}"
+            self._generate(img, os.path.basename(image_path), result)
 
         except Exception as e:
             logger.error(f"Error procesando {os.path.basename(image_path)} con Gemini API: {type(e).__name__} - {e}", exc_info=True)
             result["error"] = f"API error: {type(e).__name__} - {e}"
 
-        return result
\ No newline at end of file
+        return result
+
+    def extract_text_from_image_bytes(self, image_bytes, mime_type='image/jpeg', image_filename='imagen'):
+        """
+        Envía una imagen ya codificada en memoria a la API de Gemini y extrae el texto.
+        Evita escribir y releer un archivo temporal (p.ej. para imágenes redimensionadas).
+        
+        Args:
+            image_bytes: Contenido de la imagen codificada (JPEG, PNG, ...)
+            mime_type: Tipo MIME de image_bytes
+            image_filename: Nombre a reportar en el resultado
+            
+        Returns:
+            dict: Diccionario con los resultados formateados
+        """
+        result = {
+            "image_filename": image_filename,
+            "processed_date": datetime.today().strftime('%d%m%Y'),
+            "extracted_text": "",
+            "error": None
+        }
+
+        try:
+            self._generate({"mime_type": mime_type, "data": image_bytes}, image_filename, result)
+        except Exception as e:
+            logger.error(f"Error procesando {image_filename} con Gemini API: {type(e).__name__} - {e}", exc_info=True)
+            result["error"] = f"API error: {type(e).__name__} - {e}"
+
+        return result
+
+    def _generate(self, image_part, image_name, result):
+        """
+        Envía el prompt y la imagen (PIL.Image o blob {mime_type, data}) a Gemini
+        y vuelca el texto o el error en `result`.
+        """
+        # Crear modelo y enviar la solicitud
+        logger.debug(f"Enviando imagen {image_name} a Gemini API")
+        model = genai.GenerativeModel(self.model_name)
+        
+        # Enviar solicitud a la API con timeout generoso
+        response = model.generate_content([self.prompt, image_part], request_options={'timeout': 180})
+        
+        # Procesar respuesta
+        if response.parts:
+            if hasattr(response, 'text') and response.text:
+                result["extracted_text"] = response.text.strip()
+                logger.info(f"Texto extraído de {image_name} ({len(result['extracted_text'])} chars).")
+            else:
+                logger.warning(f"Respuesta sin texto para {image_name}")
+                result["error"] = "No text in response"
+        else:
+            reason = "Razón desconocida"
+            try:
+                if response.prompt_feedback and response.prompt_feedback.block_reason:
+                    reason = f"Bloqueado por: {response.prompt_feedback.block_reason}"
+            except Exception:
+                pass
+            logger.warning(f"Respuesta sin partes de texto. {reason}")
+            result["error"] = f"No parts in response: {reason}"
@@ -1,12 +1,46 @@
 # codigo/lib/cache_utils.py
+import atexit
 import os
 import json
+import time
 import hashlib
+import sqlite3
+import threading
 from datetime import datetime, timedelta
 import logging
 
 logger = logging.getLogger(__name__)
 
+# orjson es opcional: serializa/deserializa JSON varias veces más rápido que json
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+# zstandard es opcional: si está instalado, la caché se guarda comprimida (.json.zst)
+try:
+    import zstandard
+    ZSTD_AVAILABLE = True
+except ImportError:
+    ZSTD_AVAILABLE = False
+
+COMPRESSED_EXTENSION = ".json.zst"
+PLAIN_EXTENSION = ".json"
+ZSTD_LEVEL = 3
+
+# Índice SQLite con metadatos de las entradas de caché de API (errores permanentes, imagen)
+CACHE_INDEX_FILENAME = "cache_index.sqlite"
+INDEXED_KEY_PREFIXES = ("gemini_", "api_")
+# Las filas nuevas se acumulan y se escriben en lote: al juntar INDEX_BATCH_SIZE filas,
+# tras INDEX_FLUSH_SECONDS desde la última escritura, antes de cada consulta y al salir
+INDEX_BATCH_SIZE = 64
+INDEX_FLUSH_SECONDS = 5.0
+_index_lock = threading.Lock()
+_index_connections = {}  # Conexión abierta (con el esquema ya creado) por directorio de caché
+_pending_index_rows = {}  # Filas pendientes de escribir por directorio de caché
+_last_index_flush = {}  # Momento (time.monotonic) de la última escritura por directorio
+
 def get_cache_key(input_data):
     """Genera una clave MD5 para una cadena o bytes."""
     if isinstance(input_data, str):
@@ -21,16 +55,52 @@ def get_cache_key(input_data):
             logger.error(f"No se pudo generar la clave de caché para el tipo {type(input_data)}: {e}")
             raise TypeError("El input para get_cache_key debe ser string o bytes")
 
+def _dumps(data):
+    """Serializa a bytes UTF-8 (orjson si está disponible)."""
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(data)
+    return json.dumps(data, ensure_ascii=False).encode('utf-8')
+
+def _loads(raw):
+    """Deserializa bytes JSON (orjson si está disponible)."""
+    if ORJSON_AVAILABLE:
+        return orjson.loads(raw)
+    return json.loads(raw)
+
+def cache_key_from_filename(filename):
+    """Retorna la clave de caché de un nombre de archivo (.json o .json.zst) o None."""
+    for extension in (COMPRESSED_EXTENSION, PLAIN_EXTENSION):
+        if filename.endswith(extension):
+            return filename[:-len(extension)]
+    return None
+
+def find_cache_file(cache_dir, cache_key):
+    """Retorna la ruta del archivo de caché de una clave (comprimido o no) o None si no existe."""
+    for extension in (COMPRESSED_EXTENSION, PLAIN_EXTENSION):
+        cache_file = os.path.join(cache_dir, f"{cache_key}{extension}")
+        if os.path.exists(cache_file):
+            return cache_file
+    return None
+
+def read_cache_file(cache_file):
+    """Lee y decodifica un archivo de caché, descomprimiéndolo si es .json.zst."""
+    with open(cache_file, 'rb') as f:
+        raw = f.read()
+    if cache_file.endswith(COMPRESSED_EXTENSION):
+        if not ZSTD_AVAILABLE:
+            raise ValueError("zstandard no está instalado; no se puede leer caché comprimida")
+        raw = zstandard.ZstdDecompressor().decompress(raw)
+    return _loads(raw)
+
 def load_from_cache(cache_dir, cache_key, cache_expiry_seconds):
     """
     Carga datos desde un archivo de caché si existe y no ha expirado.
     Retorna el contenido cacheado o None.
     """
-    cache_file = os.path.join(cache_dir, f"{cache_key}.json")
-    if os.path.exists(cache_file):
+    cache_file = find_cache_file(cache_dir, cache_key)
+    if cache_file:
         try:
-            with open(cache_file, 'r', encoding='utf-8') as f:
-                cache_data = json.load(f)
+            cache_data = read_cache_file(cache_file)
             
             timestamp = cache_data.get('timestamp')
             content = cache_data.get('content')
@@ -66,7 +136,8 @@ def save_to_cache(cache_dir, cache_key, content, expiry_seconds=None):
             logger.error(f"Error creando directorio de caché {cache_dir}: {e}")
             return # No intentar guardar si no se puede crear el dir
 
-    cache_file = os.path.join(cache_dir, f"{cache_key}.json")
+    extension = COMPRESSED_EXTENSION if ZSTD_AVAILABLE else PLAIN_EXTENSION
+    cache_file = os.path.join(cache_dir, f"{cache_key}{extension}")
     cache_data = {
         'timestamp': datetime.now().timestamp(),
         'content': content
@@ -79,26 +150,183 @@ def save_to_cache(cache_dir, cache_key, content, expiry_seconds=None):
         expiry_date = datetime.now() + timedelta(seconds=expiry_seconds)
         cache_data['expires_at'] = expiry_date.strftime('%Y-%m-%d %H:%M:%S')
     try:
-        with open(cache_file, 'w', encoding='utf-8') as f:
-            json.dump(cache_data, f, ensure_ascii=False)
+        serialized = _dumps(cache_data)
+        if ZSTD_AVAILABLE:
+            serialized = zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(serialized)
+        with open(cache_file, 'wb') as f:
+            f.write(serialized)
         logger.debug(f"Contenido guardado en caché: {cache_file}")
+        # Eliminar la versión con la otra extensión para que no quede una entrada obsoleta
+        stale_extension = PLAIN_EXTENSION if ZSTD_AVAILABLE else COMPRESSED_EXTENSION
+        stale_file = os.path.join(cache_dir, f"{cache_key}{stale_extension}")
+        if os.path.exists(stale_file):
+            os.remove(stale_file)
+        if cache_key.startswith(INDEXED_KEY_PREFIXES):
+            update_cache_index(cache_dir, cache_key, content, cache_data['timestamp'])
     except TypeError as e:
          logger.error(f"Error de tipo al serializar contenido para caché (clave {cache_key}): {e}. Contenido: {str(content)[:100]}...")
     except Exception as e:
         logger.warning(f"Error al guardar caché en {cache_file}: {e}")
 
+def _index_row(cache_key, content, timestamp):
+    """Construye la fila del índice para una entrada de caché."""
+    content = content if isinstance(content, dict) else {}
+    return (
+        cache_key,
+        content.get('image_filename'),
+        1 if content.get('_permanent_error') else 0,
+        content.get('_error_reason'),
+        content.get('error'),
+        timestamp
+    )
+
+def _open_cache_index(cache_dir):
+    """
+    Abre (o crea) el índice SQLite del directorio de caché.
+    Si el índice no existía, lo rellena escaneando una única vez los archivos existentes.
+    """
+    index_path = os.path.join(cache_dir, CACHE_INDEX_FILENAME)
+    is_new = not os.path.exists(index_path)
+    # Se comparte entre hilos, siempre bajo _index_lock
+    conn = sqlite3.connect(index_path, timeout=30, check_same_thread=False)
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS entries("
+        "key TEXT PRIMARY KEY, image_filename TEXT, permanent INT, reason TEXT, error TEXT, ts REAL)"
+    )
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_perm ON entries(permanent, image_filename)")
+    if is_new:
+        rows = []
+        # scandir entrega nombre y ruta de cada entrada sin un stat/join adicional por archivo
+        with os.scandir(cache_dir) as entries:
+            for entry in entries:
+                if not entry.name.startswith(INDEXED_KEY_PREFIXES):
+                    continue
+                cache_key = cache_key_from_filename(entry.name)
+                if not cache_key:
+                    continue
+                try:
+                    cache_data = read_cache_file(entry.path)
+                    rows.append(_index_row(cache_key, cache_data.get('content'), cache_data.get('timestamp')))
+                except Exception as e:
+                    logger.debug(f"Error indexando archivo de caché {entry.name}: {e}")
+        conn.executemany("INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?)", rows)
+        conn.commit()
+        logger.info(f"Índice de caché creado en {index_path} ({len(rows)} entradas existentes)")
+    return conn
+
+def _get_index_connection(cache_dir):
+    """Retorna la conexión al índice del directorio, abriéndola una sola vez. Requiere _index_lock."""
+    dir_key = os.path.abspath(cache_dir)
+    conn = _index_connections.get(dir_key)
+    if conn is None:
+        conn = _open_cache_index(cache_dir)
+        _index_connections[dir_key] = conn
+    return conn
+
+def _flush_index_rows(cache_dir):
+    """Escribe en una sola transacción las filas pendientes del directorio. Requiere _index_lock."""
+    dir_key = os.path.abspath(cache_dir)
+    rows = _pending_index_rows.pop(dir_key, None)
+    _last_index_flush[dir_key] = time.monotonic()
+    if not rows:
+        return
+    conn = _get_index_connection(cache_dir)
+    # Si una clave se guardó varias veces, prevalece la última fila
+    conn.executemany("INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?)", rows)
+    conn.commit()
+
+def update_cache_index(cache_dir, cache_key, content, timestamp):
+    """
+    Registra (o actualiza) una entrada en el índice SQLite de la caché.
+    La escritura se agrupa con las de otras entradas (ver INDEX_BATCH_SIZE).
+    """
+    dir_key = os.path.abspath(cache_dir)
+    try:
+        with _index_lock:
+            rows = _pending_index_rows.setdefault(dir_key, [])
+            rows.append(_index_row(cache_key, content, timestamp))
+            last_flush = _last_index_flush.setdefault(dir_key, time.monotonic())
+            if len(rows) >= INDEX_BATCH_SIZE or time.monotonic() - last_flush >= INDEX_FLUSH_SECONDS:
+                _flush_index_rows(cache_dir)
+    except sqlite3.Error as e:
+        logger.warning(f"Error actualizando índice de caché para {cache_key}: {e}")
+
+def flush_cache_index(cache_dir=None):
+    """Escribe las filas pendientes del índice de un directorio (o de todos si es None)."""
+    with _index_lock:
+        cache_dirs = [cache_dir] if cache_dir is not None else list(_pending_index_rows)
+        for pending_dir in cache_dirs:
+            try:
+                _flush_index_rows(pending_dir)
+            except sqlite3.Error as e:
+                logger.warning(f"Error escribiendo índice de caché de {pending_dir}: {e}")
+
+def close_cache_index(cache_dir):
+    """Escribe las filas pendientes y cierra la conexión al índice del directorio."""
+    dir_key = os.path.abspath(cache_dir)
+    with _index_lock:
+        try:
+            _flush_index_rows(cache_dir)
+        except sqlite3.Error as e:
+            logger.warning(f"Error escribiendo índice de caché de {cache_dir}: {e}")
+        conn = _index_connections.pop(dir_key, None)
+        if conn is not None:
+            conn.close()
+
+def _close_all_cache_indexes():
+    for dir_key in list(_index_connections) + list(_pending_index_rows):
+        close_cache_index(dir_key)
+
+atexit.register(_close_all_cache_indexes)
+
+def list_permanent_errors(cache_dir):
+    """
+    Consulta en el índice las entradas marcadas como error permanente.
+    Retorna una lista de diccionarios con key, image_filename, reason, error y timestamp.
+    """
+    with _index_lock:
+        _flush_index_rows(cache_dir)
+        rows = _get_index_connection(cache_dir).execute(
+            "SELECT key, image_filename, reason, error, ts FROM entries WHERE permanent = 1"
+        ).fetchall()
+    return [
+        {"key": key, "image_filename": image_filename, "reason": reason, "error": error, "timestamp": ts}
+        for key, image_filename, reason, error, ts in rows
+    ]
+
+def remove_permanent_errors(cache_dir, image_filename):
+    """
+    Elimina del índice y del disco las entradas de error permanente de una imagen.
+    Retorna la lista de claves eliminadas.
+    """
+    with _index_lock:
+        _flush_index_rows(cache_dir)
+        conn = _get_index_connection(cache_dir)
+        keys = [row[0] for row in conn.execute(
+            "SELECT key FROM entries WHERE permanent = 1 AND image_filename = ?", (image_filename,)
+        )]
+        conn.executemany("DELETE FROM entries WHERE key = ?", [(key,) for key in keys])
+        conn.commit()
+    for key in keys:
+        cache_file = find_cache_file(cache_dir, key)
+        if cache_file:
+            os.remove(cache_file)
+    return keys
+
 def clear_cache(cache_dir):
      """Elimina todos los archivos del directorio de caché."""
      if not os.path.isdir(cache_dir):
          logger.warning(f"El directorio de caché {cache_dir} no existe o no es un directorio.")
          return False
+     # El índice también se borra: cerrar antes su conexión (se recreará al usarse)
+     close_cache_index(cache_dir)
      try:
          count = 0
-         for filename in os.listdir(cache_dir):
-             file_path = os.path.join(cache_dir, filename)
-             if os.path.isfile(file_path):
-                 os.remove(file_path)
-                 count += 1
+         with os.scandir(cache_dir) as entries:
+             for entry in entries:
+                 if entry.is_file():
+                     os.remove(entry.path)
+                     count += 1
          logger.info(f"Se eliminaron {count} archivos de caché de {cache_dir}")
          return True
      except Exception as e:
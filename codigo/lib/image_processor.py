@@ -1,23 +1,61 @@
 # codigo/lib/image_processor.py
+import io
 import os
 import requests
 import logging
 import time
 import random
+import re
+import threading
 from urllib.parse import urlparse
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
 from datetime import datetime
 import imghdr
 import imagehash
+import numpy as np
 from PIL import Image
 import hashlib
-import json
+
+# pyvips es opcional: reduce imágenes grandes sin decodificarlas completas
+try:
+    import pyvips
+    PYVIPS_AVAILABLE = True
+except ImportError:
+    PYVIPS_AVAILABLE = False
+
+# Términos que, en un error de API, indican que la imagen no se podrá procesar
+PERMANENT_ERROR_TERMS = (
+    "timeout", "too large", "too big", "size limit",
+    "demasiado grande", "demasiado pesada", "limits exceeded",
+    "memory", "memoria", "out of", "unable to process",
+    "quota", "rate limit", "rate-limit"
+)
+
+# pyahocorasick es opcional: un autómata recorre el mensaje una sola vez para todos los términos
+try:
+    import ahocorasick
+    _PERMANENT_ERROR_AUTOMATON = ahocorasick.Automaton()
+    for _term in PERMANENT_ERROR_TERMS:
+        _PERMANENT_ERROR_AUTOMATON.add_word(_term, _term)
+    _PERMANENT_ERROR_AUTOMATON.make_automaton()
+    _PERMANENT_ERROR_PATTERN = None
+except ImportError:
+    _PERMANENT_ERROR_AUTOMATON = None
+    _PERMANENT_ERROR_PATTERN = re.compile("|".join(re.escape(term) for term in PERMANENT_ERROR_TERMS))
+
+# Reutilización de resultados entre imágenes con el mismo pHash: el pHash no ve el texto
+# (plantillas con distinto titular colisionan), así que además deben coincidir las
+# dimensiones y el tamaño de archivo, con esta diferencia relativa como máximo
+PHASH_REUSE_SIZE_TOLERANCE = 0.02
 
 # Importar utilidades locales
-from .cache_utils import get_cache_key, load_from_cache, save_to_cache
+from .cache_utils import (
+    get_cache_key, load_from_cache, save_to_cache, list_permanent_errors, remove_permanent_errors,
+    find_cache_file, cache_key_from_filename
+)
 from .file_manager import save_to_json, ensure_dir_exists
 from .api_client import ImageTextExtractorAPI # Importar cliente API
-from .request_utils import get_session
+from .request_utils import get_session, TokenBucket, get_retry_after_seconds
 
 # Verificaciones rápidas de tipo de archivo de imagen y hash
 
@@ -85,6 +123,66 @@ def fast_hash_file(filepath):
         logger.debug(f"Error calculando hash para {filepath}: {e}")
         return None
 
+def resize_large_image(filepath, max_side=2500):
+    """
+    Genera en memoria una versión JPEG reducida de una imagen grande para enviarla a la API.
+    Usa pyvips.thumbnail (shrink-on-load y acceso secuencial) si está disponible,
+    con Pillow como respaldo si pyvips no está instalado o falla.
+    Retorna una tupla (bytes_jpeg, ancho, alto) de la imagen generada.
+    """
+    if PYVIPS_AVAILABLE:
+        try:
+            thumb = pyvips.Image.thumbnail(filepath, max_side, height=max_side, size='down')
+            jpeg_bytes = thumb.jpegsave_buffer(Q=85, strip=True, optimize_coding=True)
+            return jpeg_bytes, thumb.width, thumb.height
+        except Exception as e:
+            logger.debug(f"pyvips no pudo redimensionar {filepath}: {e}. Usando Pillow.")
+
+    with Image.open(filepath) as img:
+        width, height = img.size
+        # Calcular nueva dimensión manteniendo proporción
+        ratio = (width / height)
+        if ratio > 1:  # Más ancha que alta
+            new_width = min(max_side, width)
+            new_height = int(new_width / ratio)
+        else:  # Más alta que ancha
+            new_height = min(max_side, height)
+            new_width = int(new_height * ratio)
+
+        img_resized = img.resize((new_width, new_height), Image.Resampling.LANCZOS)
+        buffer = io.BytesIO()
+        img_resized.save(buffer, "JPEG", quality=85)
+    return buffer.getvalue(), new_width, new_height
+
+def is_permanent_error_message(error_msg):
+    """
+    Indica si un mensaje de error (en minúsculas) contiene alguno de los
+    PERMANENT_ERROR_TERMS, con una sola pasada sobre el texto.
+    """
+    if _PERMANENT_ERROR_AUTOMATON is not None:
+        return next(_PERMANENT_ERROR_AUTOMATON.iter(error_msg), None) is not None
+    return _PERMANENT_ERROR_PATTERN.search(error_msg) is not None
+
+def perceptual_hash_fields(perceptual_hash):
+    """
+    Campos de resultado para un pHash entero de 64 bits: el entero y, por
+    compatibilidad con resultados anteriores, su forma hexadecimal.
+    """
+    return {
+        "perceptual_hash": perceptual_hash,
+        "perceptual_hash_hex": f"{perceptual_hash:016x}"
+    }
+
+def hamming_distances(hashes, query):
+    """
+    Calcula en una sola operación vectorizada la distancia de Hamming entre
+    un pHash de 64 bits (entero) y un arreglo uint64 de pHash almacenados.
+    """
+    xor = np.bitwise_xor(hashes, np.uint64(query))
+    if hasattr(np, "bitwise_count"):  # NumPy >= 2.0 (popcount nativo)
+        return np.bitwise_count(xor)
+    return np.unpackbits(xor.view(np.uint8)).reshape(-1, 64).sum(axis=1)
+
 def identify_file_type(filepath):
     """
     Identifica el tipo de archivo basado en el contenido/cabecera.
@@ -146,6 +244,120 @@ def identify_file_type(filepath):
         logger.debug(f"Error identificando tipo de archivo {filepath}: {e}")
         return 'application/octet-stream'
 
+def prepare_image_for_api(filepath):
+    """
+    Etapa de preparación (solo CPU/disco) previa a la llamada a la API.
+    Verifica tamaño, tipo y validez del archivo, y calcula el hash perceptual y el hash
+    de contenido. Es una función de módulo para poder ejecutarse en un ProcessPoolExecutor.
+
+    Retorna un diccionario pequeño con 'filepath', 'content_hash' y 'perceptual_hash' (entero),
+    o con 'error_result' si la imagen no debe enviarse a la API.
+    """
+    prep = {"filepath": filepath, "error_result": None}
+    # Fecha de procesamiento calculada una sola vez (time.strftime evita crear un datetime)
+    today = time.strftime('%d%m%Y')
+
+    if not filepath or not os.path.exists(filepath):
+        logger.warning(f"Archivo no encontrado para procesar con API: {filepath}")
+        prep["error_result"] = {
+            "image_filename": os.path.basename(filepath) if filepath else "desconocido",
+            "processed_date": today,
+            "extracted_text": "",
+            "error": "File not found",
+            "_cache_error": True
+        }
+        return prep
+
+    # Verificar el tamaño antes de procesar (evitar procesamiento innecesario)
+    try:
+        file_size = os.path.getsize(filepath)
+        prep["file_size"] = file_size
+        # Umbral para imágenes demasiado grandes (10MB para este ejemplo)
+        if file_size > 10 * 1024 * 1024:
+            logger.warning(f"Archivo demasiado grande para procesar eficientemente: {filepath} ({file_size/1024/1024:.2f} MB)")
+            prep["error_result"] = {
+                "image_filename": os.path.basename(filepath),
+                "processed_date": today,
+                "extracted_text": "",
+                "error": "Image file too large",
+                "_cache_error": True,
+                "_permanent_error": True,
+                "_error_reason": "Imagen demasiado grande (>10MB)",
+                "file_size_mb": round(file_size/1024/1024, 2)
+            }
+            return prep
+    except Exception as e:
+        logger.warning(f"Error comprobando tamaño de archivo {filepath}: {e}")
+
+    # Verificar la extensión del archivo para detectar multimedia (mp3, mp4, etc.)
+    filename = os.path.basename(filepath)
+    if filename.lower().endswith(('.mp3', '.mp4', '.wav', '.avi', '.mov', '.flv', '.wmv', '.ogg')):
+        logger.warning(f"Archivo multimedia detectado por extensión: {filepath}")
+        prep["error_result"] = {
+            "image_filename": filename,
+            "processed_date": today,
+            "extracted_text": "",
+            "error": "File is multimedia content, not an image",
+            "_cache_error": True,
+            "_permanent_error": True,  # Marcar como error permanente
+            "_error_reason": "Archivo es contenido multimedia, no una imagen",
+            "detected_type": "multimedia",
+            "file_extension": os.path.splitext(filename)[1],
+            "is_media_file": True
+        }
+        return prep
+
+    # Verificar si el archivo es realmente una imagen válida usando la utilidad optimizada
+    is_image, image_format = is_valid_image(filepath)
+    if not is_image:
+        logger.warning(f"Archivo no es una imagen válida: {filepath} (formato detectado: {image_format})")
+        prep["error_result"] = {
+            "image_filename": os.path.basename(filepath),
+            "processed_date": today,
+            "extracted_text": "",
+            "error": "File is not a valid image",
+            "_cache_error": True,
+            "_permanent_error": True,  # Marcar como error permanente
+            "_error_reason": "Archivo no es una imagen válida",
+            "detected_type": image_format
+        }
+        return prep
+
+    # Calcular hash perceptual para imágenes (para detectar duplicados visuales)
+    # Y usarlo además del hash de contenido para el caché
+    perceptual_hash = None
+    try:
+        with Image.open(filepath) as img:
+            # Guardar dimensiones originales (antes de draft) para la etapa de API
+            prep["width"], prep["height"] = img.size
+            # phash solo usa una versión de 32x32 en grises: reducir directamente a 64x64 en grises.
+            # draft() permite a JPEG decodificar ya reducido (escalado DCT); no afecta a otros formatos.
+            img.draft('L', (64, 64))
+            small = img.convert('L')
+            small.thumbnail((64, 64), Image.Resampling.BILINEAR)
+            # Calcular hash perceptual (es resistente a cambios menores)
+            # Guardar como entero de 64 bits (más compacto y apto para búsqueda vectorizada)
+            perceptual_hash = int(str(imagehash.phash(small, hash_size=8, highfreq_factor=4)), 16)
+    except Exception as e:
+        logger.debug(f"No se pudo calcular hash perceptual: {e}")
+
+    # Calcular hash eficiente del archivo para la clave de caché primaria
+    content_hash = fast_hash_file(filepath)
+    if not content_hash:
+        logger.warning(f"No se pudo calcular hash para archivo: {filepath}")
+        prep["error_result"] = {
+            "image_filename": os.path.basename(filepath),
+            "processed_date": today,
+            "extracted_text": "",
+            "error": "Failed to calculate file hash",
+            "_cache_error": True
+        }
+        return prep
+
+    prep["perceptual_hash"] = perceptual_hash
+    prep["content_hash"] = content_hash
+    return prep
+
 logger = logging.getLogger(__name__)
 
 class ImageProcessor:
@@ -157,6 +369,15 @@ class ImageProcessor:
         self.session = get_session()  # Usar sesión global compartida
         self.headers = config.get('headers', {}) # Usar headers de config (User-Agent)
         self.max_workers = config.get('max_workers', 5)
+        # Procesos para la etapa de preparación (hash perceptual, hash de contenido)
+        self.prepare_workers = config.get('prepare_workers', os.cpu_count() or 1)
+        # Distancia de Hamming máxima para reutilizar el resultado de un pHash cercano
+        # (opcional: por defecto 0, solo se reutilizan pHash idénticos)
+        self.phash_max_distance = config.get('phash_max_distance', 0)
+        self._phash_index = None  # Se carga bajo demanda desde la caché
+        self._phash_arr = None  # pHash almacenados como uint64 para búsqueda vectorizada
+        self._phash_refs = []  # Referencia perceptual correspondiente a cada posición de _phash_arr
+        self._phash_lock = threading.Lock()
 
         # Inicializar cliente Gemini API
         try:
@@ -173,6 +394,12 @@ class ImageProcessor:
                 prompt_key=prompt_key
             )
             logger.info(f"Cliente Gemini API inicializado con modelo {model_name}")
+            
+            # Token bucket compartido por todos los hilos que llaman a la API
+            self.rate_limiter = TokenBucket(
+                rate=float(api_config.get('requests_per_second', 0.5)),
+                capacity=int(api_config.get('burst', api_config.get('batch_size', 3)))
+            )
         except Exception as e:
             self.api_client = None
             logger.warning(f"No se pudo inicializar Gemini API: {e}")
@@ -431,6 +658,9 @@ class ImageProcessor:
         if not downloaded_metadata:
             logger.warning("No hay metadatos de imágenes para procesar con la API.")
             return []
+        
+        # Fecha de procesamiento calculada una sola vez para todos los resultados de error
+        today = time.strftime('%d%m%Y')
             
         if not self.api_client:
             logger.error("API de extracción de texto de imágenes no inicializada. Verifica la clave API.")
@@ -438,7 +668,7 @@ class ImageProcessor:
             return [
                 {
                     "image_filename": meta.get("filename", os.path.basename(meta.get("filepath", "unknown"))),
-                    "processed_date": datetime.today().strftime('%d%m%Y'),
+                    "processed_date": today,
                     "extracted_text": "",
                     "error": "API client not initialized. Check if API key is valid and configured.",
                     "_cache_error": True,
@@ -455,7 +685,7 @@ class ImageProcessor:
             return [
                 {
                     "image_filename": meta.get("filename", os.path.basename(meta.get("filepath", "unknown"))),
-                    "processed_date": datetime.today().strftime('%d%m%Y'),
+                    "processed_date": today,
                     "extracted_text": "",
                     "error": "API key not valid or service unavailable. Check your API configuration.",
                     "_cache_error": True,
@@ -488,6 +718,9 @@ class ImageProcessor:
         # Seguimiento de imágenes que fallaron en primer intento (para reintentar)
         failed_items = []
         
+        # Preparar (verificar + hashear) las imágenes en otros procesos mientras se llama a la API
+        prep_executor, prep_futures = self._start_prepare_pipeline(items)
+        
         # Procesar en batches secuenciales
         while items:
             batch_count += 1
@@ -497,24 +730,16 @@ class ImageProcessor:
             logger.info(f"Procesando batch {batch_count} ({len(current_batch)} imágenes)")
             batch_results = []
             
-            # Procesar cada imagen en el batch
-            for url, meta in current_batch:
-                filepath = meta.get("filepath")
+            # Procesar las imágenes del batch en paralelo; el ritmo de llamadas a la API
+            # lo controla el token bucket compartido (self.rate_limiter)
+            with ThreadPoolExecutor(max_workers=len(current_batch)) as executor:
+                results_in_order = list(executor.map(
+                    lambda item: self._process_batch_item(item[0], item[1], prep_futures),
+                    current_batch
+                ))
+            
+            for (url, meta), result in zip(current_batch, results_in_order):
                 filename = meta.get("filename")
-                
-                if not filepath or not os.path.exists(filepath):
-                    logger.warning(f"Archivo no encontrado: {filepath}")
-                    result = {
-                        "image_filename": filename if filename else "unknown",
-                        "processed_date": datetime.today().strftime('%d%m%Y'),
-                        "extracted_text": "",
-                        "error": "File not found",
-                        "_cache_error": True
-                    }
-                else:
-                    logger.info(f"Procesando imagen con API: {filename}")
-                    result = self._process_single_image_api_with_cache(meta)
-                    
                 # Verificar resultado
                 if result.get("error"):
                     logger.warning(f"Error procesando imagen {filename}: {result.get('error')}")
@@ -525,9 +750,6 @@ class ImageProcessor:
                 # Añadir a resultados
                 result["url"] = url
                 batch_results.append(result)
-                
-                # Opcional: pequeña pausa entre imágenes del mismo batch
-                time.sleep(random.uniform(0.5, 1))
             
             # Añadir resultados del batch
             api_results.extend(batch_results)
@@ -546,6 +768,9 @@ class ImageProcessor:
                     items = failed_items
                     failed_items = []
         
+        if prep_executor:
+            prep_executor.shutdown(cancel_futures=True)
+        
         # Guardar resultados en archivo JSON
         output_json_path = self.paths.get("image_api_results_json")
         if output_json_path:
@@ -567,6 +792,64 @@ class ImageProcessor:
 
         return api_results
         
+    def _process_batch_item(self, url, meta, prep_futures):
+        """
+        Procesa una imagen de un batch: usa el resultado de la etapa de preparación
+        si ya está disponible y llama a la API (con caché).
+        """
+        filepath = meta.get("filepath")
+        filename = meta.get("filename")
+        
+        if not filepath or not os.path.exists(filepath):
+            logger.warning(f"Archivo no encontrado: {filepath}")
+            return {
+                "image_filename": filename if filename else "unknown",
+                "processed_date": time.strftime('%d%m%Y'),
+                "extracted_text": "",
+                "error": "File not found",
+                "_cache_error": True
+            }
+        
+        logger.info(f"Procesando imagen con API: {filename}")
+        prep = None
+        prep_future = prep_futures.pop(url, None)
+        if prep_future is not None:
+            try:
+                prep = prep_future.result()
+            except Exception as e:
+                # Si falla el proceso auxiliar, se prepara en este proceso
+                logger.debug(f"Error en preparación paralela de {filename}: {e}")
+        return self._process_single_image_api_with_cache(meta, prep)
+    
+    def _start_prepare_pipeline(self, items):
+        """
+        Lanza prepare_image_for_api para todas las imágenes en un ProcessPoolExecutor.
+        La decodificación y hashing de las siguientes imágenes se solapa con la
+        espera de red de la imagen actual.
+        
+        Args:
+            items (list): Lista de tuplas (url, metadata)
+            
+        Returns:
+            tuple: (executor o None, diccionario {url: future})
+        """
+        workers = min(self.prepare_workers, len(items))
+        if workers <= 1:
+            return None, {}
+        
+        try:
+            executor = ProcessPoolExecutor(max_workers=workers)
+            futures = {
+                url: executor.submit(prepare_image_for_api, meta.get("filepath"))
+                for url, meta in items
+                if meta.get("filepath")
+            }
+            logger.debug(f"Etapa de preparación iniciada con {workers} procesos")
+            return executor, futures
+        except Exception as e:
+            logger.warning(f"No se pudo iniciar la preparación paralela: {e}. Se preparará cada imagen secuencialmente.")
+            return None, {}
+        
     def _verify_api_availability(self):
         """
         Verifica que la API de Gemini esté disponible con una pequeña imagen de prueba.
@@ -640,109 +923,51 @@ class ImageProcessor:
         
         return all_have_errors, api_key_errors
 
-    def _process_single_image_api_with_cache(self, image_meta):
+    def _process_single_image_api_with_cache(self, image_meta, prep=None):
          """
          Wrapper optimizado para llamar a la API para una imagen, usando caché basado en hash de archivo.
          Implementa comprobaciones eficientes de imágenes y cachés mejorados.
+         Si se recibe `prep` (resultado de prepare_image_for_api calculado en otro proceso)
+         se omite la etapa de verificación y hashing.
          """
-         filepath = image_meta.get("filepath")
-         if not filepath or not os.path.exists(filepath):
-              logger.warning(f"Archivo no encontrado para procesar con API: {filepath}")
-              return {
-                 "image_filename": os.path.basename(filepath) if filepath else "desconocido",
-                 "processed_date": datetime.today().strftime('%d%m%Y'),
-                 "extracted_text": "",
-                 "error": "File not found",
-                 "_cache_error": True
-              }
-        
-         # Verificar el tamaño antes de procesar (evitar procesamiento innecesario)
-         try:
-             file_size = os.path.getsize(filepath)
-             # Umbral para imágenes demasiado grandes (10MB para este ejemplo)
-             if file_size > 10 * 1024 * 1024:
-                 logger.warning(f"Archivo demasiado grande para procesar eficientemente: {filepath} ({file_size/1024/1024:.2f} MB)")
-                 return {
-                     "image_filename": os.path.basename(filepath),
-                     "processed_date": datetime.today().strftime('%d%m%Y'),
-                     "extracted_text": "",
-                     "error": "Image file too large",
-                     "_cache_error": True,
-                     "_permanent_error": True,
-                     "_error_reason": "Imagen demasiado grande (>10MB)",
-                     "file_size_mb": round(file_size/1024/1024, 2)
-                 }
-         except Exception as e:
-             logger.warning(f"Error comprobando tamaño de archivo {filepath}: {e}")
-        
-         # Verificar la extensión del archivo para detectar multimedia (mp3, mp4, etc.)
-         filename = os.path.basename(filepath)
-         if filename.lower().endswith(('.mp3', '.mp4', '.wav', '.avi', '.mov', '.flv', '.wmv', '.ogg')):
-             logger.warning(f"Archivo multimedia detectado por extensión: {filepath}")
-             return {
-                 "image_filename": filename,
-                 "processed_date": datetime.today().strftime('%d%m%Y'),
-                 "extracted_text": "",
-                 "error": "File is multimedia content, not an image",
-                 "_cache_error": True,
-                 "_permanent_error": True,  # Marcar como error permanente
-                 "_error_reason": "Archivo es contenido multimedia, no una imagen",
-                 "detected_type": "multimedia",
-                 "file_extension": os.path.splitext(filename)[1],
-                 "is_media_file": True
-             }
-         
-         # Verificar si el archivo es realmente una imagen válida usando la utilidad optimizada
-         is_image, image_format = is_valid_image(filepath)
-         if not is_image:
-             logger.warning(f"Archivo no es una imagen válida: {filepath} (formato detectado: {image_format})")
-             return {
-                 "image_filename": os.path.basename(filepath),
-                 "processed_date": datetime.today().strftime('%d%m%Y'),
-                 "extracted_text": "",
-                 "error": "File is not a valid image",
-                 "_cache_error": True,
-                 "_permanent_error": True,  # Marcar como error permanente
-                 "_error_reason": "Archivo no es una imagen válida",
-                 "detected_type": image_format
-             }
-         
-         # Calcular hash perceptual para imágenes (para detectar duplicados visuales)
-         # Y usarlo además del hash de contenido para el caché
-         perceptual_hash = None
-         try:
-             with Image.open(filepath) as img:
-                 # Redimensionar para análisis más rápido si la imagen es muy grande
-                 if max(img.size) > 1000:
-                     img.thumbnail((1000, 1000), Image.Resampling.LANCZOS)
-                 # Calcular hash perceptual (es resistente a cambios menores)
-                 perceptual_hash = str(imagehash.phash(img))
-         except Exception as e:
-             logger.debug(f"No se pudo calcular hash perceptual: {e}")
-
-         # Calcular hash eficiente del archivo para la clave de caché primaria
-         content_hash = fast_hash_file(filepath)
-         if not content_hash:
-              logger.warning(f"No se pudo calcular hash para archivo: {filepath}")
-              return {
-                 "image_filename": os.path.basename(filepath),
-                 "processed_date": datetime.today().strftime('%d%m%Y'),
-                 "extracted_text": "",
-                 "error": "Failed to calculate file hash",
-                 "_cache_error": True
-              }
-              
+         if prep is None:
+             prep = prepare_image_for_api(image_meta.get("filepath"))
+         if prep.get("error_result"):
+             return prep["error_result"]
+         return self._call_api(image_meta, prep)
+
+    def _call_api(self, image_meta, prep):
+         """
+         Etapa de API: consulta los cachés (perceptual y por contenido) y, si no hay
+         resultado válido, envía la imagen a Gemini y guarda la respuesta en caché.
+         """
+         filepath = prep["filepath"]
+         perceptual_hash = prep.get("perceptual_hash")
          # Usar hash de contenido como clave principal, pero guardar el hash perceptual
-         cache_key = content_hash
-         
+         cache_key = prep["content_hash"]
+         today = time.strftime('%d%m%Y')
+
          # Si tenemos hash perceptual, buscar también por él (para encontrar imágenes visualmente similares)
-         if perceptual_hash and self.cache_dir and self.cache_expiry is not None:
+         if perceptual_hash is not None and self.cache_dir and self.cache_expiry is not None:
              # Primero buscar por hash perceptual
-             perceptual_cache_key = f"perceptual_{perceptual_hash}"
+             perceptual_cache_key = f"perceptual_{perceptual_hash:016x}"
              perceptual_cached_result = load_from_cache(self.cache_dir, perceptual_cache_key, self.cache_expiry)
+             similar_content_hash = None
              if perceptual_cached_result:
-                 # Si encontramos coincidencia perceptual, registrarla pero continuar con hash de contenido
                  logger.info(f"Imagen {os.path.basename(filepath)} visualmente similar a otra ya procesada")
+                 if perceptual_cached_result.get("success") and self._same_image_shape(perceptual_cached_result, prep):
+                     similar_content_hash = perceptual_cached_result.get("content_hash")
+             else:
+                 # Sin coincidencia exacta: buscar hashes perceptuales a poca distancia de Hamming
+                 similar_content_hash = self._find_similar_content_hash(perceptual_hash, prep)
+                 if similar_content_hash:
+                     logger.info(f"Imagen {os.path.basename(filepath)} casi idéntica (pHash) a otra ya procesada")
+
+             # Reutilizar el resultado exitoso de la imagen equivalente (sin llamar a la API)
+             if similar_content_hash and similar_content_hash != cache_key:
+                 reused_result = self._reuse_cached_result(similar_content_hash, cache_key, image_meta, perceptual_hash)
+                 if reused_result:
+                     return reused_result
 
          # Verificar caché principal (por hash de contenido)
          if self.cache_dir and self.cache_expiry is not None:
@@ -756,12 +981,12 @@ class ImageProcessor:
                   
                   # Asegurar que campos esperados estén presentes
                   cached_result.setdefault('image_filename', image_meta.get('filename'))
-                  cached_result.setdefault('processed_date', datetime.today().strftime('%d%m%Y'))
+                  cached_result.setdefault('processed_date', today)
                   cached_result.setdefault('extracted_text', '')
                   cached_result.setdefault('error', None)
                   # Añadir hash perceptual si lo tenemos y no estaba en el caché
-                  if perceptual_hash and 'perceptual_hash' not in cached_result:
-                      cached_result['perceptual_hash'] = perceptual_hash
+                  if perceptual_hash is not None and 'perceptual_hash' not in cached_result:
+                      cached_result.update(perceptual_hash_fields(perceptual_hash))
                   return cached_result
 
          # Si no está en caché, llamar a la API
@@ -769,79 +994,66 @@ class ImageProcessor:
          api_result = None
          
          try:
-             # Verificar dimensiones antes de enviar a la API
+             # Verificar dimensiones antes de enviar a la API (ya leídas en la etapa de preparación)
              try:
-                 with Image.open(filepath) as img:
-                     width, height = img.size
-                     pixels = width * height
-                     # Si la imagen es extremadamente grande (más de 8MP), podría causar problemas
-                     if pixels > 8000000:  # 8 megapíxeles
-                         logger.warning(f"Imagen {image_meta.get('filename')} es muy grande ({width}x{height}={pixels} píxeles). Intentando redimensionar.")
-                         # Redimensionar temporalmente para API si es muy grande
-                         temp_resized_path = filepath + ".resized.jpg"
-                         try:
-                             # Calcular nueva dimensión manteniendo proporción
-                             ratio = (width / height)
-                             if ratio > 1:  # Más ancha que alta
-                                 new_width = min(2500, width)
-                                 new_height = int(new_width / ratio)
-                             else:  # Más alta que ancha
-                                 new_height = min(2500, height)
-                                 new_width = int(new_height * ratio)
-                                 
-                             # Crear versión redimensionada
-                             img_resized = img.resize((new_width, new_height), Image.Resampling.LANCZOS)
-                             img_resized.save(temp_resized_path, "JPEG", quality=85)
-                             logger.info(f"Imagen redimensionada a {new_width}x{new_height} para API")
-                             
-                             # Usar la versión redimensionada para la API
-                             api_result = self.api_client.extract_text_from_image(temp_resized_path)
-                             
-                             # Eliminar archivo temporal después de usarlo
-                             try:
-                                 os.remove(temp_resized_path)
-                             except:
-                                 pass
-                         except Exception as resize_err:
-                             logger.warning(f"Error al redimensionar imagen: {resize_err}. Usando original.")
-                             api_result = self.api_client.extract_text_from_image(filepath)
-                     else:
-                         # Imagen de tamaño razonable, usar directamente
-                         api_result = self.api_client.extract_text_from_image(filepath)
+                 width, height = prep.get("width"), prep.get("height")
+                 if width is None or height is None:
+                     with Image.open(filepath) as img:
+                         width, height = img.size
+                 pixels = width * height
+                 # Si la imagen es extremadamente grande (más de 8MP), podría causar problemas
+                 if pixels > 8000000:  # 8 megapíxeles
+                     logger.warning(f"Imagen {image_meta.get('filename')} es muy grande ({width}x{height}={pixels} píxeles). Intentando redimensionar.")
+                     # Redimensionar en memoria para la API si es muy grande (sin archivo temporal)
+                     try:
+                         # Crear versión redimensionada (pyvips si está disponible, Pillow si no)
+                         jpeg_bytes, new_width, new_height = resize_large_image(filepath)
+                         logger.info(f"Imagen redimensionada a {new_width}x{new_height} para API")
+                         
+                         # Enviar directamente los bytes de la versión redimensionada
+                         api_result = self._rate_limited_extract_bytes(jpeg_bytes, os.path.basename(filepath))
+                     except Exception as resize_err:
+                         logger.warning(f"Error al redimensionar imagen: {resize_err}. Usando original.")
+                         api_result = self._rate_limited_extract(filepath)
+                 else:
+                     # Imagen de tamaño razonable, usar directamente
+                     api_result = self._rate_limited_extract(filepath)
              except Exception as img_err:
                  logger.warning(f"Error al verificar dimensiones de imagen: {img_err}. Intentando directamente con API.")
-                 api_result = self.api_client.extract_text_from_image(filepath)
+                 api_result = self._rate_limited_extract(filepath)
          except Exception as api_err:
              logger.error(f"Error en llamada a API para imagen {image_meta.get('filename')}: {api_err}")
              api_result = {
                  "image_filename": os.path.basename(filepath),
-                 "processed_date": datetime.today().strftime('%d%m%Y'),
+                 "processed_date": today,
                  "extracted_text": "",
                  "error": f"API error: {str(api_err)}",
                  "_cache_error": True
              }
 
-         # Implementar pacing para Gemini API (evitar límites de cuota)
-         wait_time = random.uniform(1, 3)  # Entre 1 y 3 segundos entre solicitudes
-         logger.debug(f"Esperando {wait_time:.2f} segundos antes de la siguiente solicitud a Gemini API")
-         time.sleep(wait_time)
+         # Si la API indica límite de cuota (HTTP 429), pausar el bucket para todos los hilos
+         retry_after = None
+         if api_result and api_result.get("error"):
+             retry_after = get_retry_after_seconds(api_result.get("error"))
+             if retry_after:
+                 logger.warning(f"Límite de cuota de Gemini alcanzado. Pausando solicitudes {retry_after}s")
+                 self.rate_limiter.drain(retry_after)
 
          # Guardar en caché tanto éxitos como errores
          if self.cache_dir and api_result:
              # Añadir hash perceptual al resultado si lo tenemos
-             if perceptual_hash:
-                 api_result['perceptual_hash'] = perceptual_hash
+             if perceptual_hash is not None:
+                 api_result.update(perceptual_hash_fields(perceptual_hash))
                  
              # Cachear por tiempo diferente según éxito o error
-             if api_result.get("error"):
+             if retry_after:
+                 # Un límite de cuota es transitorio (aunque su mensaje contenga "quota" o
+                 # "rate limit"): no se cachea, para reintentar la imagen tras la pausa
+                 logger.debug(f"Error de cuota para {image_meta.get('filename')}: no se cachea")
+             elif api_result.get("error"):
                  error_msg = api_result.get("error", "").lower()
                  # Verificar si el error indica que la imagen es demasiado pesada
-                 image_too_large = any(term in error_msg for term in [
-                     "timeout", "too large", "too big", "size limit", 
-                     "demasiado grande", "demasiado pesada", "limits exceeded",
-                     "memory", "memoria", "out of", "unable to process",
-                     "quota", "rate limit", "rate-limit"
-                 ])
+                 image_too_large = is_permanent_error_message(error_msg)
                  
                  # Marcar en el cache que esto es un error
                  api_result["_cache_error"] = True
@@ -855,9 +1067,10 @@ class ImageProcessor:
                      save_to_cache(self.cache_dir, f"gemini_{cache_key}", api_result, expiry_seconds=permanent_seconds)
                      
                      # Si tenemos hash perceptual, guardar también referencia cruzada
-                     if perceptual_hash:
-                         save_to_cache(self.cache_dir, f"perceptual_{perceptual_hash}", {
+                     if perceptual_hash is not None:
+                         save_to_cache(self.cache_dir, f"perceptual_{perceptual_hash:016x}", {
                              "content_hash": cache_key,
+                             "perceptual_hash": perceptual_hash,
                              "permanent_error": True,
                              "reason": api_result.get("_error_reason")
                          }, expiry_seconds=permanent_seconds)
@@ -871,14 +1084,125 @@ class ImageProcessor:
                  save_to_cache(self.cache_dir, f"gemini_{cache_key}", api_result)
                  
                  # Si tenemos hash perceptual, guardar también referencia cruzada para imágenes similares
-                 if perceptual_hash:
-                     save_to_cache(self.cache_dir, f"perceptual_{perceptual_hash}", {
+                 if perceptual_hash is not None:
+                     perceptual_ref = {
                          "content_hash": cache_key,
-                         "success": True
-                     })
+                         "perceptual_hash": perceptual_hash,
+                         "success": True,
+                         "width": prep.get("width"),
+                         "height": prep.get("height"),
+                         "file_size": prep.get("file_size")
+                     }
+                     save_to_cache(self.cache_dir, f"perceptual_{perceptual_hash:016x}", perceptual_ref)
+                     self._register_phash(perceptual_hash, perceptual_ref)
 
          return api_result
     
+    def _reuse_cached_result(self, source_content_hash, cache_key, image_meta, perceptual_hash):
+        """
+        Reutiliza el resultado exitoso cacheado de una imagen equivalente (mismo pHash)
+        y lo guarda también bajo el hash de contenido de la imagen actual.
+        Retorna el resultado o None si no hay un resultado exitoso reutilizable.
+        """
+        source_result = load_from_cache(self.cache_dir, f"gemini_{source_content_hash}", self.cache_expiry)
+        if not source_result or source_result.get("error"):
+            return None
+        
+        result = dict(source_result)
+        result['image_filename'] = image_meta.get('filename')
+        result['processed_date'] = time.strftime('%d%m%Y')
+        result.update(perceptual_hash_fields(perceptual_hash))
+        result['reused_from'] = source_content_hash
+        logger.info(f"Reutilizando texto extraído de imagen equivalente para {image_meta.get('filename')} (sin llamada a API)")
+        save_to_cache(self.cache_dir, f"gemini_{cache_key}", result)
+        return result
+    
+    def _same_image_shape(self, perceptual_ref, prep):
+        """
+        Comprobación barata que acompaña al pHash antes de reutilizar un resultado:
+        mismas dimensiones y tamaño de archivo dentro de PHASH_REUSE_SIZE_TOLERANCE.
+        Las referencias antiguas, sin estos datos, nunca se reutilizan.
+        """
+        width, height, file_size = prep.get("width"), prep.get("height"), prep.get("file_size")
+        ref_size = perceptual_ref.get("file_size")
+        if None in (width, height, file_size) or not ref_size:
+            return False
+        if perceptual_ref.get("width") != width or perceptual_ref.get("height") != height:
+            return False
+        return abs(ref_size - file_size) <= PHASH_REUSE_SIZE_TOLERANCE * max(ref_size, file_size)
+    
+    def _load_phash_index(self):
+        """
+        Carga (una sola vez) el índice en memoria {pHash como entero: referencia perceptual}
+        con las referencias perceptuales exitosas que hay en caché.
+        """
+        if self._phash_index is not None:
+            return self._phash_index
+        
+        index = {}
+        if self.cache_dir and os.path.isdir(self.cache_dir):
+            with os.scandir(self.cache_dir) as entries:
+                for entry in entries:
+                    if not entry.name.startswith("perceptual_"):
+                        continue
+                    cache_key = cache_key_from_filename(entry.name)
+                    if not cache_key:
+                        continue
+                    ref = load_from_cache(self.cache_dir, cache_key, self.cache_expiry)
+                    if ref and ref.get("success") and ref.get("content_hash"):
+                        try:
+                            # Entradas nuevas guardan el entero; las antiguas solo el hex del nombre
+                            stored = ref.get("perceptual_hash")
+                            if not isinstance(stored, int):
+                                stored = int(cache_key[len("perceptual_"):], 16)
+                            index[stored] = ref
+                        except ValueError:
+                            continue
+        self._phash_index = index
+        logger.debug(f"Índice de hashes perceptuales cargado ({len(index)} entradas)")
+        return index
+    
+    def _register_phash(self, perceptual_hash, perceptual_ref):
+        """Añade una referencia perceptual exitosa al índice en memoria."""
+        with self._phash_lock:
+            self._load_phash_index()[perceptual_hash] = perceptual_ref
+            self._phash_arr = None  # Reconstruir el arreglo en la siguiente búsqueda
+    
+    def _find_similar_content_hash(self, perceptual_hash, prep):
+        """
+        Busca en el índice en memoria un pHash a distancia de Hamming <= phash_max_distance
+        cuya imagen tenga además las mismas dimensiones y tamaño similar (_same_image_shape).
+        Retorna el hash de contenido de la imagen más parecida o None.
+        """
+        if self.phash_max_distance <= 0:
+            return None
+        query = perceptual_hash
+        with self._phash_lock:
+            if self._phash_arr is None:
+                index = self._load_phash_index()
+                self._phash_arr = np.fromiter(index.keys(), dtype=np.uint64, count=len(index))
+                self._phash_refs = list(index.values())
+            if not len(self._phash_arr):
+                return None
+            distances = hamming_distances(self._phash_arr, query)
+            # De más cercano a más lejano, solo entre los que están dentro de la distancia máxima
+            within = np.flatnonzero(distances <= self.phash_max_distance)
+            for position in within[np.argsort(distances[within], kind='stable')]:
+                perceptual_ref = self._phash_refs[position]
+                if self._same_image_shape(perceptual_ref, prep):
+                    return perceptual_ref["content_hash"]
+        return None
+    
+    def _rate_limited_extract(self, image_path):
+        """Llama a la API de Gemini respetando el token bucket compartido."""
+        self.rate_limiter.acquire()
+        return self.api_client.extract_text_from_image(image_path)
+    
+    def _rate_limited_extract_bytes(self, image_bytes, image_filename):
+        """Envía una imagen JPEG en memoria a la API respetando el token bucket compartido."""
+        self.rate_limiter.acquire()
+        return self.api_client.extract_text_from_image_bytes(image_bytes, 'image/jpeg', image_filename)
+    
     def list_permanently_skipped_images(self):
         """
         Lista todas las imágenes que están marcadas como permanentemente no procesables.
@@ -891,30 +1215,19 @@ class ImageProcessor:
             logger.warning("Directorio de caché no encontrado")
             return []
         
-        skipped_images = []
         try:
-            # Buscar todos los archivos de caché de API (gemini_ o api_)
-            for filename in os.listdir(self.cache_dir):
-                if (filename.startswith("gemini_") or filename.startswith("api_")) and filename.endswith(".json"):
-                    cache_path = os.path.join(self.cache_dir, filename)
-                    try:
-                        with open(cache_path, 'r', encoding='utf-8') as f:
-                            cache_data = json.load(f)
-                            content = cache_data.get('content', {})
-                            # Verificar si es un error permanente
-                            if content and content.get('_permanent_error'):
-                                skipped_images.append({
-                                    "cache_file": filename,
-                                    "image_filename": content.get('image_filename', 'Desconocido'),
-                                    "reason": content.get('_error_reason', 'Razón no especificada'),
-                                    "error": content.get('error', 'Error no especificado'),
-                                    "timestamp": cache_data.get('timestamp'),
-                                    "api_type": "gemini" if filename.startswith("gemini_") else "agentic"
-                                })
-                    except Exception as e:
-                        logger.debug(f"Error leyendo archivo de caché {filename}: {e}")
-            
-            return skipped_images
+            # Consulta indexada en lugar de leer cada archivo gemini_/api_ del directorio
+            return [
+                {
+                    "cache_file": os.path.basename(find_cache_file(self.cache_dir, entry['key']) or f"{entry['key']}.json"),
+                    "image_filename": entry['image_filename'] or 'Desconocido',
+                    "reason": entry['reason'] or 'Razón no especificada',
+                    "error": entry['error'] or 'Error no especificado',
+                    "timestamp": entry['timestamp'],
+                    "api_type": "gemini" if entry['key'].startswith("gemini_") else "agentic"
+                }
+                for entry in list_permanent_errors(self.cache_dir)
+            ]
         except Exception as e:
             logger.error(f"Error listando imágenes omitidas: {e}")
             return []
@@ -933,22 +1246,13 @@ class ImageProcessor:
             return False
         
         try:
-            skipped_images = self.list_permanently_skipped_images()
-            for img_info in skipped_images:
-                if img_info["image_filename"] == image_filename:
-                    cache_path = os.path.join(self.cache_dir, img_info["cache_file"])
-                    if os.path.exists(cache_path):
-                        os.remove(cache_path)
-                        logger.info(f"Eliminada imagen {image_filename} de la lista de omitidas permanentemente")
-                        return True
+            removed_keys = remove_permanent_errors(self.cache_dir, image_filename)
+            if removed_keys:
+                logger.info(f"Eliminada imagen {image_filename} de la lista de omitidas permanentemente")
+                return True
             
             logger.warning(f"No se encontró {image_filename} en la lista de omitidas permanentemente")
             return False
         except Exception as e:
             logger.error(f"Error eliminando imagen de la lista de omitidas: {e}")
             return False
-
-
-# Import hashlib aquí si no está global
-import hashlib
-import json  # Asegurar que json está importado
\ No newline at end of file
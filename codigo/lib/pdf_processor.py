@@ -2,12 +2,15 @@
 import fitz  # PyMuPDF
 import logging
 import os
+from concurrent.futures import ProcessPoolExecutor
 
 logger = logging.getLogger(__name__)
 
-def get_text_around_link(page, link_dict):
+def get_text_around_link(page, link_dict, page_rect=None, textpage=None):
     """
     Intenta extraer texto alrededor del rectángulo del enlace para dar contexto.
+    `page_rect` y `textpage` permiten reutilizar el rectángulo y el TextPage
+    de la página entre todos sus enlaces en lugar de recalcularlos por enlace.
     """
     try:
         if 'from' in link_dict: # PyMuPDF >= 1.19 usa 'from' para el Rect
@@ -25,13 +28,16 @@ def get_text_around_link(page, link_dict):
                                   rect.x1 + h_margin, rect.y1 + v_margin)
 
         # Asegurarse de que el rectángulo expandido no se salga de la página
-        page_rect = page.rect
+        if page_rect is None:
+            page_rect = page.rect
         expanded_rect.intersect(page_rect)
 
         if expanded_rect.is_empty or expanded_rect.width <= 0 or expanded_rect.height <= 0:
              return "" # Área inválida
 
-        text = page.get_text("text", clip=expanded_rect, sort=True).strip()
+        # Con un TextPage reutilizado, PyMuPDF solo aplica `clip` en la ruta con sort=True
+        # (con sort=False lo ignora y devolvería el texto de toda la página)
+        text = page.get_text("text", clip=expanded_rect, sort=True, textpage=textpage).strip()
         # Limpieza simple: reemplazar saltos de línea múltiples por espacio
         text = ' '.join(text.split())
         return text
@@ -40,6 +46,59 @@ def get_text_around_link(page, link_dict):
         logger.warning(f"Error extrayendo contexto para enlace {link_dict.get('uri', 'N/A')}: {e}")
         return ""
 
+# Extracción paralela de páginas (solo para PDFs grandes)
+PDF_MAX_WORKERS = 8
+PDF_PAGES_PER_WORKER = 25
+
+def _extract_page_links(page, page_num):
+    """
+    Extrae los enlaces URI (no mailto) de una página con su rectángulo y contexto.
+    """
+    links = []
+    page_links = page.get_links() # Obtiene todos los tipos de enlaces
+    if not page_links:
+        return links
+
+    # Construir el TextPage y el rectángulo de la página una sola vez por página
+    page_rect = page.rect
+    textpage = page.get_textpage()
+
+    for link_dict in page_links:
+        # Verificar que sea un enlace URI y no un mailto
+        if link_dict.get('kind') == fitz.LINK_URI:
+            uri = link_dict.get('uri')
+            if uri and not uri.lower().startswith('mailto:'):
+                 context = get_text_around_link(page, link_dict, page_rect, textpage)
+                 rect = link_dict.get('from') # PyMuPDF >= 1.19
+                 if rect:
+                     rect_tuple = (rect.x0, rect.y0, rect.x1, rect.y1)
+                 else: # Compatibilidad con versiones anteriores
+                     rect_compat = link_dict.get('rect')
+                     rect_tuple = tuple(rect_compat) if rect_compat else None
+
+                 links.append({
+                    "Page": page_num + 1,
+                    "URL": uri,
+                    "Rect": rect_tuple, # Guardar como tupla simple
+                    "Context": context
+                })
+        # Podrías añadir lógica aquí para otros tipos de enlaces si fuera necesario
+        # elif link_dict.get('kind') == fitz.LINK_GOTO:
+        #     # Enlace interno
+        #     pass
+    return links
+
+def _extract_links_from_page_range(pdf_path, start, stop):
+    """
+    Abre su propio manejador del PDF y extrae los enlaces de las páginas [start, stop).
+    Función de módulo para poder ejecutarse en un ProcessPoolExecutor.
+    """
+    links = []
+    with fitz.open(pdf_path) as doc:
+        for page_num in range(start, stop):
+            links.extend(_extract_page_links(doc.load_page(page_num), page_num))
+    return links
+
 def extract_links_from_pdf(pdf_path):
     """
     Abre un archivo PDF y extrae todos los enlaces URI (http, https, ftp),
@@ -62,38 +121,34 @@ def extract_links_from_pdf(pdf_path):
         logger.error(f"Error al abrir o procesar el archivo PDF '{pdf_path}': {e}")
         return links # Retorna lista vacía si no se puede abrir
 
-    for page_num in range(doc.page_count):
-        page = doc.load_page(page_num)
-        page_links = page.get_links() # Obtiene todos los tipos de enlaces
-
-        for link_dict in page_links:
-            # Verificar que sea un enlace URI y no un mailto
-            if link_dict.get('kind') == fitz.LINK_URI:
-                uri = link_dict.get('uri')
-                if uri and not uri.lower().startswith('mailto:'):
-                     context = get_text_around_link(page, link_dict)
-                     rect = link_dict.get('from') # PyMuPDF >= 1.19
-                     if rect:
-                         rect_tuple = (rect.x0, rect.y0, rect.x1, rect.y1)
-                     else: # Compatibilidad con versiones anteriores
-                         rect_compat = link_dict.get('rect')
-                         rect_tuple = tuple(rect_compat) if rect_compat else None
-
-                     links.append({
-                        "Page": page_num + 1,
-                        "URL": uri,
-                        "Rect": rect_tuple, # Guardar como tupla simple
-                        "Context": context
-                    })
-            # Podrías añadir lógica aquí para otros tipos de enlaces si fuera necesario
-            # elif link_dict.get('kind') == fitz.LINK_GOTO:
-            #     # Enlace interno
-            #     pass
+    page_count = doc.page_count
+    workers = min(PDF_MAX_WORKERS, os.cpu_count() or 1, page_count // PDF_PAGES_PER_WORKER)
 
-    try:
-        doc.close()
-    except Exception as e:
-         logger.warning(f"Error menor al cerrar el PDF '{pdf_path}': {e}")
+    if workers > 1:
+        # PDFs grandes: repartir rangos de páginas entre procesos, cada uno con su propio documento
+        try:
+            doc.close()
+        except Exception as e:
+             logger.warning(f"Error menor al cerrar el PDF '{pdf_path}': {e}")
+        chunk = -(-page_count // workers)  # División entera hacia arriba
+        starts = list(range(0, page_count, chunk))
+        stops = [min(start + chunk, page_count) for start in starts]
+        try:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                # map conserva el orden original de las páginas
+                for range_links in executor.map(_extract_links_from_page_range, [pdf_path] * len(starts), starts, stops):
+                    links.extend(range_links)
+        except Exception as e:
+            logger.warning(f"Error en extracción paralela de '{pdf_path}': {e}. Procesando secuencialmente.")
+            links = _extract_links_from_page_range(pdf_path, 0, page_count)
+    else:
+        for page_num in range(page_count):
+            links.extend(_extract_page_links(doc.load_page(page_num), page_num))
+
+        try:
+            doc.close()
+        except Exception as e:
+             logger.warning(f"Error menor al cerrar el PDF '{pdf_path}': {e}")
 
 
     logger.info(f"Se extrajeron {len(links)} enlaces URI (no mailto) de {os.path.basename(pdf_path)}.")
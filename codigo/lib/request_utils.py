@@ -2,6 +2,9 @@
 import requests
 import random
 import logging
+import re
+import threading
+import time
 from urllib3.util import Retry
 from requests.adapters import HTTPAdapter
 
@@ -9,6 +12,7 @@ logger = logging.getLogger(__name__)
 
 # Singleton para mantener una única sesión global con reintentos
 _global_session = None
+_session_lock = threading.Lock()
 
 def get_session(retries=3, backoff_factor=0.5, status_forcelist=(500, 502, 503, 504), 
                 pool_connections=20, pool_maxsize=20, pool_block=False):
@@ -28,31 +32,98 @@ def get_session(retries=3, backoff_factor=0.5, status_forcelist=(500, 502, 503,
     """
     global _global_session
     
-    if _global_session is None:
-        _global_session = requests.Session()
+    with _session_lock:
+        if _global_session is None:
+            _global_session = requests.Session()
         
-        # Configurar estrategia de reintentos
-        retry_strategy = Retry(
-            total=retries,
-            read=retries, 
-            connect=retries,
-            backoff_factor=backoff_factor,
-            status_forcelist=status_forcelist,
-            # Agregar jitter aleatorio para evitar peticiones sincronizadas
-            backoff_jitter=random.uniform(0, 0.1)
-        )
+            # Configurar estrategia de reintentos
+            retry_strategy = Retry(
+                total=retries,
+                read=retries, 
+                connect=retries,
+                backoff_factor=backoff_factor,
+                status_forcelist=status_forcelist,
+                # Agregar jitter aleatorio para evitar peticiones sincronizadas
+                backoff_jitter=random.uniform(0, 0.1)
+            )
         
-        # Crear y montar adaptadores con la estrategia de reintentos
-        adapter = HTTPAdapter(
-            max_retries=retry_strategy,
-            pool_connections=pool_connections,
-            pool_maxsize=pool_maxsize,
-            pool_block=pool_block
-        )
+            # Crear y montar adaptadores con la estrategia de reintentos
+            adapter = HTTPAdapter(
+                max_retries=retry_strategy,
+                pool_connections=pool_connections,
+                pool_maxsize=pool_maxsize,
+                pool_block=pool_block
+            )
         
-        _global_session.mount("http://", adapter)
-        _global_session.mount("https://", adapter)
+            _global_session.mount("http://", adapter)
+            _global_session.mount("https://", adapter)
         
-        logger.info("Sesión global con reintentos inicializada")
+            logger.info("Sesión global con reintentos inicializada")
     
     return _global_session
+
+# Patrones para extraer el tiempo de espera sugerido en errores de cuota (HTTP 429)
+_RETRY_AFTER_PATTERN = re.compile(r'retry[-_ ]?(?:after|delay)\D{0,20}?(\d+(?:\.\d+)?)', re.IGNORECASE)
+_RATE_LIMIT_PATTERN = re.compile(r'\b429\b|resource[ _]?exhausted|rate[- ]limit|quota', re.IGNORECASE)
+
+def get_retry_after_seconds(error_msg, default=60):
+    """
+    Interpreta un mensaje de error de API y retorna cuántos segundos esperar
+    si corresponde a un límite de cuota (HTTP 429), o None si no lo es.
+    
+    Args:
+        error_msg: Texto del error devuelto por la API
+        default: Segundos a esperar si el error no incluye un Retry-After explícito
+    """
+    if not error_msg or not _RATE_LIMIT_PATTERN.search(str(error_msg)):
+        return None
+    match = _RETRY_AFTER_PATTERN.search(str(error_msg))
+    return float(match.group(1)) if match else default
+
+class TokenBucket:
+    """
+    Limitador de tasa token-bucket seguro entre hilos.
+    Admite ráfagas de hasta `capacity` solicitudes y limita la tasa media
+    a `rate` solicitudes por segundo. Solo bloquea cuando no quedan tokens.
+    """
+    def __init__(self, rate, capacity):
+        self.rate = max(float(rate), 1e-6)
+        self.capacity = max(float(capacity), 1.0)
+        self._tokens = self.capacity
+        self._last = time.monotonic()
+        self._blocked_until = 0.0
+        self._cond = threading.Condition()
+
+    def _refill(self, now):
+        # Durante un bloqueo (drain) no se acumulan tokens
+        start = max(self._last, self._blocked_until)
+        if now > start:
+            self._tokens = min(self.capacity, self._tokens + (now - start) * self.rate)
+        self._last = now
+
+    def acquire(self, tokens=1):
+        """Consume `tokens`, esperando solo lo necesario hasta que estén disponibles."""
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                self._refill(now)
+                if now >= self._blocked_until and self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                if now < self._blocked_until:
+                    wait = self._blocked_until - now
+                else:
+                    wait = (tokens - self._tokens) / self.rate
+                self._cond.wait(wait)
+
+    def drain(self, seconds):
+        """
+        Vacía el bucket y bloquea nuevas solicitudes durante `seconds`
+        (por ejemplo, tras un HTTP 429 con Retry-After).
+        """
+        with self._cond:
+            now = time.monotonic()
+            self._refill(now)
+            self._tokens = 0.0
+            self._blocked_until = max(self._blocked_until, now + seconds)
+            self._cond.notify_all()
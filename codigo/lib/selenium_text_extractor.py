@@ -2,11 +2,27 @@
 Módulo para extraer texto de URLs usando Selenium.
 """
 
+import atexit
 import logging
+import queue
 from selenium_content_extractor import SeleniumContentExtractor
 
 logger = logging.getLogger("selenium_text_extractor")
 
+# Pool de extractores con Chrome ya iniciado, para no pagar el arranque en cada URL
+_driver_pool = queue.Queue()
+
+def _close_pooled_drivers():
+    """Cierra todos los Chrome del pool al terminar el proceso."""
+    while True:
+        try:
+            extractor = _driver_pool.get_nowait()
+        except queue.Empty:
+            break
+        extractor.close()
+
+atexit.register(_close_pooled_drivers)
+
 def extract_text_with_selenium(url: str, timeout: int = 30) -> str:
     """Extrae texto de una URL usando Selenium.
     
@@ -17,11 +33,17 @@ def extract_text_with_selenium(url: str, timeout: int = 30) -> str:
     Returns:
         str: Texto extraído o cadena vacía si falla
     """
-    extractor = SeleniumContentExtractor(headless=True)
+    try:
+        extractor = _driver_pool.get_nowait()
+    except queue.Empty:
+        extractor = SeleniumContentExtractor(headless=True, reuse_driver=True)
     try:
         result = extractor.extract_content(url, use_cache=True)
         if result.get('success', False):
             return result.get('text', '')
     except Exception as e:
         logger.error(f"Error extrayendo texto de {url}: {e}")
+    finally:
+        extractor.reset_state()
+        _driver_pool.put(extractor)
     return ''
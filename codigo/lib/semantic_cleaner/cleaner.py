@@ -4,23 +4,199 @@ SemanticCleaner: Clase principal para realizar limpieza semántica de textos con
 Este módulo implementa algoritmos de procesamiento de lenguaje natural para detectar
 y eliminar contenido redundante entre diferentes fuentes como PDF, páginas HTML y 
 publicaciones de Facebook.
+
+Uso:
+    python -m lib.semantic_cleaner.cleaner --input-json RUTA [--output-json RUTA]
+        [--threshold FLOAT] [--vectorizer-cache RUTA] [--signature-cache RUTA]
 """
 
+import argparse
 import os
 import json
+import hashlib
 import logging
 import nltk
 import re
-from collections import defaultdict
+import sqlite3
+import threading
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 from datetime import datetime
 from typing import Dict, List, Tuple, Set, Any, Optional, Union
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
+from sklearn.feature_extraction.text import HashingVectorizer, TfidfTransformer, TfidfVectorizer
+import joblib
 import numpy as np
+from scipy import sparse
+from scipy.sparse.csgraph import connected_components
+
+# datasketch es opcional: MinHash-LSH evita comparar todos los pares de textos
+try:
+    from datasketch import MinHash, MinHashLSH
+    DATASKETCH_AVAILABLE = True
+except ImportError:
+    DATASKETCH_AVAILABLE = False
 
 # Configuración del logging
 logger = logging.getLogger(__name__)
 
+# Parámetros de MinHash-LSH para la detección de candidatos redundantes (solo a partir de
+# LSH_MIN_TEXTS textos). El umbral es de Jaccard sobre shingles de palabras, una escala
+# mucho más baja que el coseno TF-IDF: un texto con el 5% de palabras cambiadas ronda
+# 0.5 de Jaccard y 0.9 de coseno, así que no puede reutilizarse similarity_threshold
+MINHASH_NUM_PERM = 128
+SHINGLE_SIZE = 5
+LSH_MIN_TEXTS = 2000
+LSH_JACCARD_THRESHOLD = 0.3
+
+# Cálculo paralelo de firmas MinHash (solo para corpus grandes)
+MINHASH_MAX_WORKERS = 8
+MINHASH_TEXTS_PER_WORKER = 250
+
+# Caché persistente de textos limpios y firmas MinHash por documento
+SIGNATURE_DIGEST_SIZE = 16
+SIGNATURE_QUERY_BATCH = 500
+
+# Reutilización del vectorizador TF-IDF entre ejecuciones: se reajusta si el vocabulario
+# guardado cubre menos de esta fracción de los términos distintos nuevos, o si tiene más
+# días de los indicados (por defecto una semana: con ejecuciones diarias, un límite de un
+# día obligaría a reajustar siempre; la cobertura ya detecta los cambios de vocabulario)
+VOCABULARY_MIN_COVERAGE = 0.8
+VOCABULARY_COVERAGE_SAMPLE = 200
+DEFAULT_VECTORIZER_MAX_AGE_DAYS = 7.0
+
+# Corpus muy grandes: hashing de términos en lugar de vocabulario en memoria
+HASHING_MIN_TEXTS = 20000
+HASHING_N_FEATURES = 2 ** 18
+
+def _shingles(text: str) -> Set[str]:
+    """
+    Divide un texto limpio en shingles de SHINGLE_SIZE palabras consecutivas.
+    Los textos más cortos se representan con un único shingle.
+    """
+    words = text.split()
+    if len(words) <= SHINGLE_SIZE:
+        return {" ".join(words)} if words else set()
+    return {" ".join(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)}
+
+
+def _minhash_signatures(texts: List[str]) -> List[np.ndarray]:
+    """
+    Calcula las firmas MinHash (hashvalues) de una lista de textos limpios.
+    Función de módulo para poder ejecutarse en un ProcessPoolExecutor; la semilla
+    por defecto de MinHash hace que las permutaciones coincidan entre procesos.
+    """
+    signatures = []
+    for text in texts:
+        minhash = MinHash(num_perm=MINHASH_NUM_PERM)
+        minhash.update_batch([shingle.encode('utf-8') for shingle in _shingles(text)])
+        signatures.append(minhash.hashvalues)
+    return signatures
+
+def _text_digest(text: str) -> bytes:
+    """Huella BLAKE2b del texto, usada como clave de la caché de firmas."""
+    return hashlib.blake2b(text.encode('utf-8'), digest_size=SIGNATURE_DIGEST_SIZE).digest()
+
+
+class SignatureCache:
+    """
+    Caché SQLite de resultados por documento que no cambian entre ejecuciones:
+    texto limpio por texto original y firma MinHash por texto limpio, ambos
+    indexados por la huella BLAKE2b del texto. Segura entre hilos.
+    """
+    def __init__(self, db_path: str):
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, timeout=30, check_same_thread=False)
+        self._conn.execute("CREATE TABLE IF NOT EXISTS cleaned_texts(key BLOB PRIMARY KEY, value TEXT)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS minhash_signatures(key BLOB PRIMARY KEY, value BLOB)")
+        self._conn.commit()
+
+    def get_many(self, table: str, keys: List[bytes]) -> Dict[bytes, Any]:
+        """Retorna {clave: valor} para las claves presentes en la tabla."""
+        found = {}
+        unique_keys = list(set(keys))
+        with self._lock:
+            for start in range(0, len(unique_keys), SIGNATURE_QUERY_BATCH):
+                batch = unique_keys[start:start + SIGNATURE_QUERY_BATCH]
+                placeholders = ",".join("?" * len(batch))
+                found.update(self._conn.execute(
+                    f"SELECT key, value FROM {table} WHERE key IN ({placeholders})", batch
+                ))
+        return found
+
+    def put_many(self, table: str, rows: List[Tuple[bytes, Any]]) -> None:
+        """Guarda (o reemplaza) pares (clave, valor) en la tabla."""
+        if not rows:
+            return
+        with self._lock:
+            self._conn.executemany(f"INSERT OR REPLACE INTO {table} VALUES (?, ?)", rows)
+            self._conn.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+# Limpieza de texto en una sola pasada: URLs y etiquetas HTML se eliminan,
+# los signos de puntuación se reemplazan por espacio
+_NOISE_PATTERN = re.compile(r'(?P<drop>https?://\S+|www\.\S+|<.*?>)|[^\w\s<]+|<')
+
+
+def _replace_noise(match) -> str:
+    return '' if match.lastgroup == 'drop' else ' '
+
+# Palabras clave para cada tema
+TOPIC_KEYWORDS = {
+    "noticias_sunass": ["sunass", "superintendencia", "nacional", "servicios", "saneamiento", 
+                      "módulo", "atención", "orientación", "ciudadano", "mac", "regulador"],
+    "agua_saneamiento": ["agua", "potable", "desagüe", "alcantarillado", "eps", "sedapal", 
+                       "sedalib", "epsel", "ptar", "planta", "tratamiento", "residuales"],
+    "politica_economia": ["gobierno", "ministerio", "economía", "vivienda", "proyecto", 
+                        "inversión", "millones", "presupuesto", "soles", "financiamiento"]
+}
+
+# pyahocorasick es opcional: un autómata encuentra todas las palabras clave en una sola pasada
+try:
+    import ahocorasick
+    _TOPIC_AUTOMATON = ahocorasick.Automaton()
+    for _topic, _keywords in TOPIC_KEYWORDS.items():
+        for _keyword in _keywords:
+            _TOPIC_AUTOMATON.add_word(_keyword, (_topic, _keyword))
+    _TOPIC_AUTOMATON.make_automaton()
+except ImportError:
+    _TOPIC_AUTOMATON = None
+
+
+def _count_topic_keywords(text: str) -> Dict[str, int]:
+    """Cuenta cuántas palabras clave distintas de cada tema aparecen en el texto."""
+    if _TOPIC_AUTOMATON is not None:
+        found = {value for _, value in _TOPIC_AUTOMATON.iter(text)}
+        counts = defaultdict(int)
+        for topic, _ in found:
+            counts[topic] += 1
+        return counts
+    return {
+        topic: sum(1 for keyword in keywords if keyword in text)
+        for topic, keywords in TOPIC_KEYWORDS.items()
+    }
+
+
+def _connected_groups(adjacency: sparse.spmatrix) -> List[List[int]]:
+    """
+    Agrupa los índices en componentes conexas de la matriz de adyacencia dispersa.
+    
+    Returns:
+        Lista de grupos ordenados por su primer índice, cada uno con índices ascendentes
+    """
+    _, labels = connected_components(adjacency, directed=False)
+    # Las etiquetas se asignan en orden de primera aparición, así que el orden se conserva
+    order = np.argsort(labels, kind='stable')
+    _, starts = np.unique(labels[order], return_index=True)
+    return [group.tolist() for group in np.split(order, starts[1:])]
+
 # Descargar recursos de NLTK si no están presentes
 try:
     nltk.data.find('tokenizers/punkt')
@@ -32,6 +208,12 @@ try:
 except LookupError:
     nltk.download('stopwords', quiet=True)
 
+# Stopwords en español (más algunas comunes en noticias), leídas una sola vez por proceso
+SPANISH_STOPWORDS = frozenset(nltk.corpus.stopwords.words('spanish')) | {
+    'según', 'indica', 'señala', 'informó', 'dijo', 'añadió',
+    'explicó', 'además', 'también', 'asimismo', 'mientras'
+}
+
 
 class SemanticCleaner:
     """
@@ -39,27 +221,66 @@ class SemanticCleaner:
     y generar un documento consolidado limpio.
     """
     
-    def __init__(self, similarity_threshold: float = 0.65):
+    def __init__(self, similarity_threshold: float = 0.65, vectorizer_cache_path: Optional[str] = None,
+                 signature_cache_path: Optional[str] = None,
+                 vectorizer_max_age_days: Optional[float] = DEFAULT_VECTORIZER_MAX_AGE_DAYS):
         """
         Inicializa el limpiador semántico.
         
         Args:
             similarity_threshold: Umbral de similitud para considerar textos como redundantes
                                  (valor entre 0 y 1, donde 1 es identidad completa)
+            vectorizer_cache_path: Ruta opcional (.joblib) donde persistir el vectorizador
+                                   TF-IDF ajustado para reutilizarlo en ejecuciones siguientes
+            signature_cache_path: Ruta opcional de una base SQLite donde guardar textos limpios
+                                  y firmas MinHash por documento (p.ej. output/cache/sigs.sqlite)
+            vectorizer_max_age_days: Antigüedad máxima (en días) del vectorizador guardado antes
+                                     de reajustarlo; None para decidir solo por cobertura
         """
         self.similarity_threshold = similarity_threshold
-        self.stopwords = set(nltk.corpus.stopwords.words('spanish'))
-        # Agregar algunas stopwords adicionales comunes en noticias
-        self.stopwords.update(['según', 'indica', 'señala', 'informó', 'dijo', 'añadió',
-                              'explicó', 'además', 'también', 'asimismo', 'mientras'])
+        self.stopwords = SPANISH_STOPWORDS
         
         # Configurar el vectorizador TF-IDF
         self.vectorizer = TfidfVectorizer(
             min_df=2,
             max_df=0.95,
             max_features=5000,
-            stop_words=self.stopwords
+            stop_words=list(self.stopwords),
+            norm='l2',
+            sublinear_tf=True
         )
+        
+        # Para corpus muy grandes: HashingVectorizer no guarda vocabulario (memoria constante)
+        # y TfidfTransformer solo aprende el vector IDF sobre la matriz ya hasheada
+        self.hashing_vectorizer = HashingVectorizer(
+            n_features=HASHING_N_FEATURES,
+            alternate_sign=False,
+            norm=None,
+            stop_words=list(self.stopwords)
+        )
+        self.tfidf_transformer = TfidfTransformer(norm='l2', sublinear_tf=True)
+        
+        # Cargar el vectorizador ajustado en una ejecución anterior, si existe
+        self.vectorizer_cache_path = vectorizer_cache_path
+        self._vectorizer_fitted = False
+        self._vectorizer_fitted_at = 0.0
+        self.vectorizer_max_age_days = vectorizer_max_age_days
+        if vectorizer_cache_path and os.path.exists(vectorizer_cache_path):
+            try:
+                self.vectorizer = joblib.load(vectorizer_cache_path)
+                self._vectorizer_fitted = True
+                self._vectorizer_fitted_at = os.path.getmtime(vectorizer_cache_path)
+                logger.info(f"Vectorizador TF-IDF cargado desde: {vectorizer_cache_path}")
+            except Exception as e:
+                logger.warning(f"No se pudo cargar el vectorizador TF-IDF {vectorizer_cache_path}: {e}")
+        
+        # Caché de documentos sin cambios entre ejecuciones (opcional)
+        self.signature_cache = None
+        if signature_cache_path:
+            try:
+                self.signature_cache = SignatureCache(signature_cache_path)
+            except sqlite3.Error as e:
+                logger.warning(f"No se pudo abrir la caché de firmas {signature_cache_path}: {e}")
     
     def clean_text(self, text: str) -> str:
         """
@@ -74,40 +295,29 @@ class SemanticCleaner:
         if not text:
             return ""
             
-        # Eliminar URLs
-        text = re.sub(r'https?://\S+|www\.\S+', '', text)
-        
-        # Eliminar etiquetas HTML si las hubiera
-        text = re.sub(r'<.*?>', '', text)
-        
-        # Reemplazar saltos de línea con espacio
-        text = re.sub(r'\n+', ' ', text)
-        
-        # Eliminar caracteres especiales y dígitos
-        text = re.sub(r'[^\w\s]', ' ', text)
+        # Eliminar URLs y etiquetas HTML y reemplazar caracteres especiales en una pasada
+        text = _NOISE_PATTERN.sub(_replace_noise, text)
         
-        # Reemplazar múltiples espacios con un solo espacio
-        text = re.sub(r'\s+', ' ', text)
-        
-        return text.strip().lower()
+        # Unificar saltos de línea y espacios múltiples en un solo espacio
+        return ' '.join(text.split()).lower()
     
-    def extract_content_from_json(self, data: Dict) -> Dict[str, List[Dict[str, Any]]]:
+    def clean_text_batch(self, texts: List[str]) -> List[str]:
         """
-        Extrae contenido relevante del JSON consolidado.
+        Limpia una lista de textos con el mismo patrón precompilado que clean_text,
+        evitando el costo de una llamada a método por texto.
         
         Args:
-            data: Diccionario que contiene el JSON consolidado
+            texts: Lista de textos a limpiar
             
         Returns:
-            Diccionario con contenido extraído por tipo de fuente
+            Lista de textos limpios, en el mismo orden
         """
-        extracted_content = {
-            "pdf": [],
-            "html": [],
-            "facebook": []
-        }
-        
-        # Extraer contenido del PDF
+        sub = _NOISE_PATTERN.sub
+        return [' '.join(sub(_replace_noise, text).split()).lower() if text else "" for text in texts]
+    
+    def _extract_pdf_items(self, data: Dict) -> List[Dict[str, Any]]:
+        """Extrae y limpia los párrafos del PDF del JSON consolidado."""
+        items = []
         try:
             if "pdf_paragraphs" in data["extracted_content"]:
                 for section_name, paragraphs in data["extracted_content"]["pdf_paragraphs"].items():
@@ -117,18 +327,20 @@ class SemanticCleaner:
                         page = paragraph.get("page", 0)
                         
                         if text:
-                            extracted_content["pdf"].append({
+                            items.append({
                                 "text": text,
                                 "metadata": metadata,
                                 "page": page,
                                 "source": "pdf",
-                                "source_name": section_name,
-                                "cleaned_text": self.clean_text(text)
+                                "source_name": section_name
                             })
         except (KeyError, TypeError) as e:
             logger.warning(f"Error extrayendo contenido PDF: {e}")
-        
-        # Extraer contenido HTML
+        return self._add_cleaned_texts(items)
+    
+    def _extract_html_items(self, data: Dict) -> List[Dict[str, Any]]:
+        """Extrae y limpia las páginas HTML relevantes del JSON consolidado."""
+        items = []
         try:
             if "html_pages" in data["extracted_content"]:
                 for url, page_data in data["extracted_content"]["html_pages"].items():
@@ -138,18 +350,20 @@ class SemanticCleaner:
                     
                     # Solo incluir páginas con cierta relevancia
                     if text and relevance >= 0.3:
-                        extracted_content["html"].append({
+                        items.append({
                             "text": text,
                             "metadata": metadata,
                             "url": url,
                             "relevance": relevance,
-                            "source": "html",
-                            "cleaned_text": self.clean_text(text)
+                            "source": "html"
                         })
         except (KeyError, TypeError) as e:
             logger.warning(f"Error extrayendo contenido HTML: {e}")
-        
-        # Extraer contenido de Facebook
+        return self._add_cleaned_texts(items)
+    
+    def _extract_facebook_items(self, data: Dict) -> List[Dict[str, Any]]:
+        """Extrae y limpia las publicaciones de Facebook del JSON consolidado."""
+        items = []
         try:
             if "facebook_texts" in data["extracted_content"]:
                 for url, fb_data in data["extracted_content"]["facebook_texts"].items():
@@ -158,38 +372,227 @@ class SemanticCleaner:
                     processed_date = fb_data.get("processed_date", "")
                     
                     if text:
-                        extracted_content["facebook"].append({
+                        items.append({
                             "text": text,
                             "url": url,
                             "pdf_path": pdf_path,
                             "processed_date": processed_date,
-                            "source": "facebook",
-                            "cleaned_text": self.clean_text(text)
+                            "source": "facebook"
                         })
         except (KeyError, TypeError) as e:
             logger.warning(f"Error extrayendo contenido Facebook: {e}")
+        return self._add_cleaned_texts(items)
+    
+    def _add_cleaned_texts(self, items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Limpia en un solo lote los textos de los ítems y los guarda en 'cleaned_text'.
+        Con caché de firmas, solo se limpian los textos que no se vieron antes.
+        """
+        if self.signature_cache is None:
+            cleaned_texts = self.clean_text_batch([item["text"] for item in items])
+            for item, cleaned_text in zip(items, cleaned_texts):
+                item["cleaned_text"] = cleaned_text
+            return items
+        
+        keys = [_text_digest(item["text"]) for item in items]
+        cached = self.signature_cache.get_many("cleaned_texts", keys)
+        missing = [idx for idx, key in enumerate(keys) if key not in cached]
+        cleaned_missing = self.clean_text_batch([items[idx]["text"] for idx in missing])
+        new_rows = {keys[idx]: cleaned_text for idx, cleaned_text in zip(missing, cleaned_missing)}
+        self.signature_cache.put_many("cleaned_texts", list(new_rows.items()))
+        cached.update(new_rows)
+        for item, key in zip(items, keys):
+            item["cleaned_text"] = cached[key]
+        return items
+    
+    def extract_content_from_json(self, data: Dict) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        Extrae contenido relevante del JSON consolidado.
+        Las tres fuentes son independientes y se extraen en paralelo.
+        
+        Args:
+            data: Diccionario que contiene el JSON consolidado
+            
+        Returns:
+            Diccionario con contenido extraído por tipo de fuente
+        """
+        extractors = {
+            "pdf": self._extract_pdf_items,
+            "html": self._extract_html_items,
+            "facebook": self._extract_facebook_items
+        }
+        extracted_content = {source: [] for source in extractors}
+        
+        with ThreadPoolExecutor(max_workers=len(extractors)) as executor:
+            futures = {executor.submit(extract, data): source for source, extract in extractors.items()}
+            for future in as_completed(futures):
+                extracted_content[futures[future]] = future.result()
         
         return extracted_content
     
-    def compute_similarity_matrix(self, texts: List[str]) -> np.ndarray:
+    def _vocabulary_coverage(self, texts: List[str]) -> float:
+        """
+        Fracción de los términos distintos de una muestra de los textos (los que aparecen
+        en al menos dos documentos, como exige min_df) presentes en el vocabulario del
+        vectorizador ya ajustado. Se cuentan términos distintos y no ocurrencias: las
+        palabras comunes mantendrían alta la cobertura aunque falten los temas nuevos.
+        """
+        analyzer = self.vectorizer.build_analyzer()
+        vocabulary = self.vectorizer.vocabulary_
+        # Muestra repartida por todo el corpus (los textos vienen agrupados por fuente)
+        step = max(1, len(texts) // VOCABULARY_COVERAGE_SAMPLE)
+        document_frequency = Counter()
+        for text in texts[::step]:
+            document_frequency.update(set(analyzer(text)))
+        terms = [term for term, frequency in document_frequency.items() if frequency >= 2]
+        if not terms:
+            return 0.0
+        return sum(1 for term in terms if term in vocabulary) / len(terms)
+    
+    def _vectorize(self, texts: List[str]):
+        """
+        Calcula la matriz TF-IDF de los textos. Con `vectorizer_cache_path`, reutiliza
+        el vocabulario e IDF ya ajustados (solo `transform`) mientras cubran los textos
+        nuevos y no tengan más de `vectorizer_max_age_days`; si no, reajusta el
+        vectorizador y lo guarda para la próxima ejecución.
+        Con HASHING_MIN_TEXTS textos o más se usa hashing de términos para acotar la memoria.
+        """
+        if len(texts) >= HASHING_MIN_TEXTS:
+            counts = self.hashing_vectorizer.transform(texts)
+            return self.tfidf_transformer.fit_transform(counts)
+        
+        if self.vectorizer_cache_path and self._vectorizer_fitted:
+            age_days = (time.time() - self._vectorizer_fitted_at) / 86400
+            if self.vectorizer_max_age_days is not None and age_days > self.vectorizer_max_age_days:
+                logger.info(f"Vectorizador TF-IDF con {age_days:.1f} días de antigüedad, reajustando")
+            else:
+                coverage = self._vocabulary_coverage(texts)
+                if coverage >= VOCABULARY_MIN_COVERAGE:
+                    return self.vectorizer.transform(texts)
+                logger.info(f"Cobertura de vocabulario TF-IDF baja ({coverage:.2f}), reajustando vectorizador")
+        
+        tfidf_matrix = self.vectorizer.fit_transform(texts)
+        self._vectorizer_fitted = True
+        self._vectorizer_fitted_at = time.time()
+        if self.vectorizer_cache_path:
+            try:
+                joblib.dump(self.vectorizer, self.vectorizer_cache_path)
+                logger.debug(f"Vectorizador TF-IDF guardado en: {self.vectorizer_cache_path}")
+            except Exception as e:
+                logger.warning(f"No se pudo guardar el vectorizador TF-IDF: {e}")
+        return tfidf_matrix
+    
+    def compute_similarity_matrix(self, texts: List[str]) -> sparse.csr_matrix:
         """
         Calcula la matriz de similitud entre textos usando TF-IDF y similitud del coseno.
         
+        La matriz es dispersa y solo conserva los pares con similitud mayor o igual
+        al umbral: el producto disperso TF-IDF·TF-IDFᵀ solo combina términos compartidos
+        y nunca se reserva la matriz densa N×N.
+        
         Args:
             texts: Lista de textos a comparar
             
         Returns:
-            Matriz de similitud como array de NumPy
+            Matriz de similitud dispersa (CSR) filtrada por el umbral
         """
         if not texts:
-            return np.array([])
+            return sparse.csr_matrix((0, 0))
             
         try:
-            tfidf_matrix = self.vectorizer.fit_transform(texts)
-            return cosine_similarity(tfidf_matrix, tfidf_matrix)
+            # Los vectores TF-IDF están normalizados (L2): el coseno es el producto escalar
+            tfidf_matrix = self._vectorize(texts)
+            similarity = (tfidf_matrix @ tfidf_matrix.T).tocsr()
+            similarity.data[similarity.data < self.similarity_threshold] = 0
+            similarity.eliminate_zeros()
+            return similarity
         except Exception as e:
             logger.error(f"Error al calcular matriz de similitud: {e}")
-            return np.zeros((len(texts), len(texts)))
+            return sparse.csr_matrix((len(texts), len(texts)))
+    
+    def _compute_minhash_signatures(self, texts: List[str]) -> List[np.ndarray]:
+        """Calcula las firmas MinHash, repartiendo los textos entre procesos si son muchos."""
+        signatures = []
+        workers = min(MINHASH_MAX_WORKERS, os.cpu_count() or 1, len(texts) // MINHASH_TEXTS_PER_WORKER)
+        if workers > 1:
+            # Corpus grandes: repartir los textos entre procesos
+            chunk = -(-len(texts) // workers)  # División entera hacia arriba
+            chunks = [texts[start:start + chunk] for start in range(0, len(texts), chunk)]
+            try:
+                with ProcessPoolExecutor(max_workers=workers) as executor:
+                    # map conserva el orden original de los textos
+                    for chunk_signatures in executor.map(_minhash_signatures, chunks):
+                        signatures.extend(chunk_signatures)
+            except Exception as e:
+                logger.warning(f"Error calculando firmas MinHash en paralelo: {e}. Calculando secuencialmente.")
+                signatures = _minhash_signatures(texts)
+        else:
+            signatures = _minhash_signatures(texts)
+        return signatures
+    
+    def _get_minhash_signatures(self, texts: List[str]) -> List[np.ndarray]:
+        """
+        Obtiene las firmas MinHash de los textos limpios, reutilizando las guardadas
+        en la caché de firmas y calculando solo las de textos nuevos.
+        """
+        if self.signature_cache is None:
+            return self._compute_minhash_signatures(texts)
+        
+        keys = [_text_digest(text) for text in texts]
+        cached = {
+            key: np.frombuffer(value, dtype=np.uint64)
+            for key, value in self.signature_cache.get_many("minhash_signatures", keys).items()
+        }
+        missing = [idx for idx, key in enumerate(keys) if key not in cached]
+        computed = self._compute_minhash_signatures([texts[idx] for idx in missing])
+        new_rows = {keys[idx]: hashvalues for idx, hashvalues in zip(missing, computed)}
+        self.signature_cache.put_many(
+            "minhash_signatures", [(key, hashvalues.tobytes()) for key, hashvalues in new_rows.items()]
+        )
+        cached.update(new_rows)
+        return [cached[key] for key in keys]
+    
+    def _find_similar_pairs_lsh(self, texts: List[str]) -> List[Tuple[int, int]]:
+        """
+        Obtiene los pares de textos redundantes sin comparar todos contra todos:
+        MinHash-LSH propone candidatos y solo para ellos se calcula el coseno TF-IDF exacto.
+        
+        Args:
+            texts: Lista de textos limpios
+            
+        Returns:
+            Lista de pares (i, j), con i < j, cuya similitud supera el umbral
+        """
+        signatures = self._get_minhash_signatures(texts)
+        
+        lsh = MinHashLSH(threshold=LSH_JACCARD_THRESHOLD, num_perm=MINHASH_NUM_PERM)
+        minhashes = []
+        for idx, hashvalues in enumerate(signatures):
+            minhash = MinHash(num_perm=MINHASH_NUM_PERM, hashvalues=hashvalues)
+            lsh.insert(idx, minhash)
+            minhashes.append(minhash)
+        
+        candidates = set()
+        for idx, minhash in enumerate(minhashes):
+            for other in lsh.query(minhash):
+                if other != idx:
+                    candidates.add((min(idx, other), max(idx, other)))
+        if not candidates:
+            return []
+        
+        try:
+            tfidf_matrix = self._vectorize(texts)
+        except Exception as e:
+            logger.error(f"Error al calcular TF-IDF para candidatos: {e}")
+            return []
+        
+        # Los vectores TF-IDF están normalizados (L2): el coseno es el producto escalar por fila
+        pairs = sorted(candidates)
+        rows = [i for i, _ in pairs]
+        cols = [j for _, j in pairs]
+        similarities = np.asarray(tfidf_matrix[rows].multiply(tfidf_matrix[cols]).sum(axis=1)).ravel()
+        return [pair for pair, similarity in zip(pairs, similarities)
+                if similarity >= self.similarity_threshold]
     
     def detect_redundant_content(self, content_items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
         """
@@ -204,35 +607,44 @@ class SemanticCleaner:
         if not content_items:
             return []
             
-        # Extraer textos limpios para procesamiento
-        cleaned_texts = [item["cleaned_text"] for item in content_items]
-        
-        # Calcular matriz de similitud
-        similarity_matrix = self.compute_similarity_matrix(cleaned_texts)
-        
-        # Detectar grupos de contenido similar
-        content_groups = []
-        processed_indices = set()
-        
-        for i in range(len(content_items)):
-            if i in processed_indices:
-                continue
-                
-            # Crear un nuevo grupo
-            similar_group = [i]
-            processed_indices.add(i)
-            
-            # Encontrar ítems similares a este
-            for j in range(len(content_items)):
-                if j != i and j not in processed_indices:
-                    if similarity_matrix[i, j] >= self.similarity_threshold:
-                        similar_group.append(j)
-                        processed_indices.add(j)
-            
-            content_groups.append(similar_group)
+        # Extraer textos limpios para procesamiento, agrupando los idénticos:
+        # las copias exactas (p.ej. publicaciones compartidas) no entran al cálculo de similitud
+        cleaned_texts = []
+        text_members = []
+        text_index = {}
+        for idx, item in enumerate(content_items):
+            text = item["cleaned_text"]
+            unique_idx = text_index.get(text) if text else None
+            if unique_idx is None:
+                unique_idx = len(cleaned_texts)
+                cleaned_texts.append(text)
+                text_members.append([])
+                if text:
+                    text_index[text] = unique_idx
+            text_members[unique_idx].append(idx)
+        
+        # Detectar grupos de contenido similar (componentes conexas del grafo de similitud)
+        n_texts = len(cleaned_texts)
+        if DATASKETCH_AVAILABLE and n_texts >= LSH_MIN_TEXTS:
+            similar_pairs = self._find_similar_pairs_lsh(cleaned_texts)
+            rows = [i for i, _ in similar_pairs]
+            cols = [j for _, j in similar_pairs]
+            adjacency = sparse.csr_matrix(
+                (np.ones(len(similar_pairs), dtype=np.int8), (rows, cols)), shape=(n_texts, n_texts)
+            )
+        else:
+            # Corpus pequeños o sin datasketch: la matriz dispersa ya contiene solo los pares sobre el umbral
+            adjacency = self.compute_similarity_matrix(cleaned_texts)
+        
+        # Expandir cada grupo de textos únicos a los ítems que los contienen
+        content_groups = [
+            sorted(idx for unique_idx in group for idx in text_members[unique_idx])
+            for group in _connected_groups(adjacency)
+        ]
         
         # Para cada grupo, elegir el representante
         unique_content = []
+        scores = None
         
         for group in content_groups:
             if len(group) == 1:
@@ -241,7 +653,9 @@ class SemanticCleaner:
             else:
                 # Si hay múltiples ítems similares, seleccionar el mejor representante
                 # Priorizar por relevancia, longitud del texto o fuente
-                best_idx = self._select_best_representative(group, content_items)
+                if scores is None:
+                    scores = self._representative_scores(content_items)
+                best_idx = self._select_best_representative(group, scores)
                 representative = content_items[best_idx]
                 
                 # Conservar información de qué contenido está fusionado
@@ -250,52 +664,39 @@ class SemanticCleaner:
         
         return unique_content
     
-    def _select_best_representative(self, group: List[int], 
-                                  content_items: List[Dict[str, Any]]) -> int:
+    def _representative_scores(self, content_items: List[Dict[str, Any]]) -> np.ndarray:
         """
-        Selecciona el mejor representante de un grupo de ítems similares.
+        Calcula de una vez el puntaje de todos los ítems para elegir representantes.
         
         Args:
-            group: Lista de índices de ítems similares
             content_items: Lista completa de ítems de contenido
             
         Returns:
-            Índice del ítem seleccionado como representante
+            Array con el puntaje de cada ítem
+        """
+        sources = np.array([item["source"] for item in content_items])
+        relevances = np.array([item.get("relevance", 0) for item in content_items], dtype=np.float64)
+        lengths = np.fromiter((len(item["text"]) for item in content_items), dtype=np.int64,
+                              count=len(content_items))
+        
+        # Dar prioridad según fuente: HTML según su relevancia, los PDF suelen tener buen contenido
+        source_score = np.where(sources == "html", relevances * 10, np.where(sources == "pdf", 5, 3))
+        # Favorecer textos más largos (pero no demasiado)
+        length_score = np.where((lengths >= 100) & (lengths <= 1000), 3, np.where(lengths > 1000, 2, 1))
+        return source_score + length_score
+    
+    def _select_best_representative(self, group: List[int], scores: np.ndarray) -> int:
         """
-        best_score = -1
-        best_idx = group[0]  # Por defecto, el primero
+        Selecciona el mejor representante de un grupo de ítems similares.
         
-        for idx in group:
-            item = content_items[idx]
-            
-            # Iniciar con puntaje base
-            score = 0
+        Args:
+            group: Lista de índices de ítems similares
+            scores: Puntajes de todos los ítems (ver _representative_scores)
             
-            # Dar prioridad según fuente
-            if item["source"] == "html":
-                # Priorizar HTML con alta relevancia
-                score += item.get("relevance", 0) * 10
-            elif item["source"] == "pdf":
-                # Los PDF suelen tener buen contenido
-                score += 5
-            else:  # Facebook
-                score += 3
-                
-            # Favorecer textos más largos (pero no demasiado)
-            text_length = len(item["text"])
-            if 100 <= text_length <= 1000:
-                score += 3
-            elif text_length > 1000:
-                score += 2
-            else:
-                score += 1
-                
-            # Actualizar si es mejor
-            if score > best_score:
-                best_score = score
-                best_idx = idx
-                
-        return best_idx
+        Returns:
+            Índice del ítem seleccionado como representante (el primero en caso de empate)
+        """
+        return group[int(np.argmax(scores[group]))]
     
     def organize_by_topics(self, unique_content: List[Dict[str, Any]]) -> Dict[str, List[Dict[str, Any]]]:
         """
@@ -315,26 +716,17 @@ class SemanticCleaner:
             "otros": []
         }
         
-        # Palabras clave para cada tema
-        topic_keywords = {
-            "noticias_sunass": ["sunass", "superintendencia", "nacional", "servicios", "saneamiento", 
-                              "módulo", "atención", "orientación", "ciudadano", "mac", "regulador"],
-            "agua_saneamiento": ["agua", "potable", "desagüe", "alcantarillado", "eps", "sedapal", 
-                               "sedalib", "epsel", "ptar", "planta", "tratamiento", "residuales"],
-            "politica_economia": ["gobierno", "ministerio", "economía", "vivienda", "proyecto", 
-                                "inversión", "millones", "presupuesto", "soles", "financiamiento"]
-        }
-        
         # Clasificar cada contenido
         for item in unique_content:
             text = item["text"].lower()
             
-            # Determinar tema según palabras clave
+            # Determinar tema según palabras clave (en empate gana el primer tema)
+            keyword_counts = _count_topic_keywords(text)
             max_matches = 0
             best_topic = "otros"
             
-            for topic, keywords in topic_keywords.items():
-                matches = sum(1 for keyword in keywords if keyword in text)
+            for topic in TOPIC_KEYWORDS:
+                matches = keyword_counts.get(topic, 0)
                 if matches > max_matches:
                     max_matches = matches
                     best_topic = topic
@@ -400,3 +792,65 @@ class SemanticCleaner:
             
         return clean_data
 
+
+
+def parse_arguments():
+    """
+    Parsea los argumentos de línea de comandos.
+    
+    Returns:
+        argparse.Namespace: Argumentos parseados
+    """
+    parser = argparse.ArgumentParser(description="Limpieza y organización por temas de un JSON consolidado")
+    parser.add_argument("--input-json", type=str, required=True, help="Ruta al archivo JSON consolidado")
+    parser.add_argument("--output-json", type=str, help="Ruta para guardar el JSON limpio (por defecto <entrada>_organized.json)")
+    parser.add_argument("--threshold", type=float, default=0.65, help="Umbral de similitud coseno (por defecto 0.65)")
+    parser.add_argument(
+        "--vectorizer-cache",
+        type=str,
+        help="Archivo .joblib para reutilizar el vectorizador TF-IDF entre ejecuciones"
+    )
+    parser.add_argument(
+        "--vectorizer-max-age-days",
+        type=float,
+        default=DEFAULT_VECTORIZER_MAX_AGE_DAYS,
+        help=f"Días tras los que se reajusta el vectorizador guardado (por defecto {DEFAULT_VECTORIZER_MAX_AGE_DAYS:g}; 0 para reajustar siempre)"
+    )
+    parser.add_argument(
+        "--signature-cache",
+        type=str,
+        help="Base SQLite para reutilizar textos limpios y firmas MinHash entre ejecuciones"
+    )
+    return parser.parse_args()
+
+
+def main(args=None):
+    """
+    Función principal del script.
+    
+    Args:
+        args (argparse.Namespace, optional): Argumentos parseados
+    """
+    if args is None:
+        args = parse_arguments()
+    
+    output_json = args.output_json or f"{os.path.splitext(args.input_json)[0]}_organized.json"
+    cleaner = SemanticCleaner(
+        similarity_threshold=args.threshold,
+        vectorizer_cache_path=getattr(args, "vectorizer_cache", None),
+        signature_cache_path=getattr(args, "signature_cache", None),
+        vectorizer_max_age_days=getattr(args, "vectorizer_max_age_days", DEFAULT_VECTORIZER_MAX_AGE_DAYS)
+    )
+    try:
+        cleaner.process_consolidated_json(args.input_json, output_json)
+    finally:
+        if cleaner.signature_cache is not None:
+            cleaner.signature_cache.close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+    main()
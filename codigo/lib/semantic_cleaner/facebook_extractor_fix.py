@@ -17,6 +17,33 @@ logging.basicConfig(
 )
 logger = logging.getLogger('facebook_extractor_fix')
 
+# Tabla de escape Markdown: una sola pasada sobre el texto en lugar de varios replace
+_MD_ESCAPE = str.maketrans({'#': '\\#', '*': '\\*', '_': '\\_'})
+
+# orjson es opcional: parsea y serializa (con indentación) en C, varias veces más rápido que json
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+def _load_json(path):
+    """Carga un archivo JSON (orjson si está disponible)."""
+    if ORJSON_AVAILABLE:
+        with open(path, 'rb') as f:
+            return orjson.loads(f.read())
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def _save_json(data, path):
+    """Guarda datos como JSON indentado (orjson si está disponible)."""
+    if ORJSON_AVAILABLE:
+        with open(path, 'wb') as f:
+            f.write(orjson.dumps(data, option=orjson.OPT_INDENT_2))
+        return
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+
 def fix_facebook_texts_extraction(date_str):
     """
     Corrige el problema de extracción de textos de Facebook.
@@ -68,11 +95,8 @@ def fix_facebook_texts_extraction(date_str):
     
     try:
         # Cargar datos
-        with open(facebook_path, 'r', encoding='utf-8') as f:
-            facebook_data = json.load(f)
-        
-        with open(clean_json_path, 'r', encoding='utf-8') as f:
-            clean_data = json.load(f)
+        facebook_data = _load_json(facebook_path)
+        clean_data = _load_json(clean_json_path)
         
         # Verificar la estructura de los datos
         if not facebook_data:
@@ -86,10 +110,6 @@ def fix_facebook_texts_extraction(date_str):
         # Añadir los textos de Facebook al JSON limpio
         clean_data["extracted_content"]["facebook_texts"] = facebook_data
         
-        # Guardar el JSON limpio actualizado
-        with open(clean_json_path, 'w', encoding='utf-8') as f:
-            json.dump(clean_data, f, ensure_ascii=False, indent=2)
-        
         # Depurar la estructura de los datos de Facebook
         logger.info(f"Estructura de los datos de Facebook: {list(facebook_data.keys())[0] if facebook_data else 'No hay datos'}")
         if facebook_data and list(facebook_data.values())[0]:
@@ -97,7 +117,8 @@ def fix_facebook_texts_extraction(date_str):
             logger.info(f"Claves en la primera entrada: {list(sample_entry.keys())}")
         
         # Generar sección de Facebook para el Markdown
-        md_fb_section = "\n## Contenido de Facebook\n\n"
+        # Acumular las partes en una lista y unirlas al final (costo lineal)
+        md_parts = ["\n## Contenido de Facebook\n\n"]
         for url, data in facebook_data.items():
             # Acceder correctamente a 'extracted_text' según la estructura
             text = data.get("extracted_text", "")
@@ -115,26 +136,35 @@ def fix_facebook_texts_extraction(date_str):
                 title = lines[0] if lines else "Publicación de Facebook"
                 title = title[:70] + "..." if len(title) > 70 else title
                 
-                md_fb_section += f"### {title}\n\n"
-                md_fb_section += f"**URL:** [{url}]({url})\n\n"
+                md_parts.append(f"### {title}\n\n")
+                md_parts.append(f"**URL:** [{url}]({url})\n\n")
                 
                 # Añadir el texto completo, con sanitización básica
-                sanitized_text = text.replace('#', '\\#').replace('*', '\\*').replace('_', '\\_')
-                md_fb_section += f"{sanitized_text[:1000]}...\n\n" if len(sanitized_text) > 1000 else f"{sanitized_text}\n\n"
-                md_fb_section += "---\n\n"
+                sanitized_text = text.translate(_MD_ESCAPE)
+                md_parts.append(f"{sanitized_text[:1000]}...\n\n" if len(sanitized_text) > 1000 else f"{sanitized_text}\n\n")
+                md_parts.append("---\n\n")
         
-        # Verificar si ya existe una sección de Facebook en el archivo
-        with open(clean_md_path, 'r', encoding='utf-8') as f:
-            current_md_content = f.read()
+        md_fb_section = ''.join(md_parts)
         
-        if "## Contenido de Facebook" not in current_md_content:
+        # Verificar en los metadatos del JSON si ya se añadió la sección (sin releer el Markdown).
+        # Los JSON generados antes de existir el indicador no lo tienen: en ese caso se revisa
+        # una única vez el Markdown y se guarda el resultado en el indicador
+        metadata = clean_data.setdefault("metadata", {})
+        if "facebook_section_appended" not in metadata:
+            with open(clean_md_path, 'r', encoding='utf-8') as f:
+                metadata["facebook_section_appended"] = "## Contenido de Facebook" in f.read()
+        if not metadata["facebook_section_appended"]:
             # Añadir la sección de Facebook al final del archivo Markdown
             with open(clean_md_path, 'a', encoding='utf-8') as f:
                 f.write(md_fb_section)
+            metadata["facebook_section_appended"] = True
             logger.info(f"Sección de Facebook añadida al archivo {clean_md_path}")
         else:
             logger.info(f"El archivo {clean_md_path} ya contiene una sección de Facebook")
         
+        # Guardar el JSON limpio actualizado
+        _save_json(clean_data, clean_json_path)
+        
         logger.info(f"Se han añadido {len(facebook_data)} textos de Facebook al archivo limpio")
         return True
     
@@ -2,19 +2,78 @@
 Módulo para convertir datos JSON limpios a formato Markdown.
 """
 
+import io
 import json
 import logging
 from datetime import datetime
+from functools import lru_cache
 import os
 import re
+from concurrent.futures import ThreadPoolExecutor
 
-# Configuración de logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
+# Logger del módulo (el punto de entrada configura el logging)
 logger = logging.getLogger('markdown_converter')
 
+# Tabla de escape de caracteres especiales de Markdown (una sola pasada con str.translate)
+_MD_ESCAPE_TABLE = str.maketrans({
+    '#': '\\#',
+    '*': '\\*',
+    '_': '\\_',
+    '`': '\\`',
+    '>': '\\>',
+    '<': '\\<'
+})
+
+# Patrón precompilado para colapsar espacios en blanco
+_WS_RE = re.compile(r'\s+')
+
+# Buffer de escritura del archivo Markdown (1 MB)
+MD_WRITE_BUFFER_SIZE = 1 << 20
+
+@lru_cache(maxsize=256)
+def _format_iso_date(date_str):
+    """Convierte una fecha ISO a formato legible (memoizado); si no es válida, la retorna igual."""
+    try:
+        if 'Z' in date_str:
+            date_str_iso = date_str.replace('Z', '+00:00')
+        else:
+            date_str_iso = date_str
+        date_obj = datetime.fromisoformat(date_str_iso)
+        return date_obj.strftime("%d/%m/%Y %H:%M:%S")
+    except ValueError:
+        return date_str
+
+# Subsecciones de estadísticas del informe: (clave en stats_summary, encabezado)
+_STATS_SECTIONS = (
+    ("html_processing", "### Procesamiento HTML\n\n"),
+    ("image_processing", "### Procesamiento de Imágenes\n\n"),
+    ("facebook_processing", "### Procesamiento de Facebook\n\n"),
+    ("timings_seconds", "### Tiempos de Procesamiento (segundos)\n\n"),
+    ("semantic_cleaning", "### Limpieza Semántica\n\n")
+)
+_STATS_EXCLUDED_KEYS = {"semantic_cleaning": ("timestamp",)}
+
+@lru_cache(maxsize=None)
+def _stats_label(key):
+    """Etiqueta legible de una clave de estadísticas (p.ej. 'total_urls' -> 'Total urls')."""
+    return key.replace('_', ' ').capitalize()
+
+# Mínimo de elementos de contenido para generar las secciones en paralelo
+PARALLEL_SECTIONS_MIN_ITEMS = 500
+
+@lru_cache(maxsize=4096)
+def _sanitize_markdown_text(text):
+    """
+    Escapa los caracteres especiales de Markdown y colapsa los espacios en blanco.
+    Se memoiza porque los textos repetidos (cabeceras, pies de página, etiquetas)
+    son frecuentes entre páginas e imágenes.
+    """
+    # Reemplazar caracteres especiales de Markdown
+    text = text.translate(_MD_ESCAPE_TABLE)
+    
+    # Eliminar múltiples espacios en blanco
+    return _WS_RE.sub(' ', text).strip()
+
 class MarkdownConverter:
     """
     Clase para convertir datos JSON a formato Markdown.
@@ -39,18 +98,22 @@ class MarkdownConverter:
         if not text or not isinstance(text, str):
             return ""
             
-        # Reemplazar caracteres especiales de Markdown
-        text = text.replace('#', '\\#')
-        text = text.replace('*', '\\*')
-        text = text.replace('_', '\\_')
-        text = text.replace('`', '\\`')
-        text = text.replace('>', '\\>')
-        text = text.replace('<', '\\<')
-        
-        # Eliminar múltiples espacios en blanco
-        text = re.sub(r'\s+', ' ', text).strip()
+        return _sanitize_markdown_text(text)
+    
+    def _sanitize_batch(self, texts):
+        """
+        Sanitiza una lista de textos para formato Markdown en una sola llamada.
         
-        return text
+        Args:
+            texts (list): Textos a sanitizar
+            
+        Returns:
+            list: Textos sanitizados, en el mismo orden
+        """
+        return [
+            _sanitize_markdown_text(text) if text and isinstance(text, str) else ""
+            for text in texts
+        ]
     
     def _format_date(self, date_str):
         """
@@ -62,273 +125,258 @@ class MarkdownConverter:
         Returns:
             str: Fecha formateada
         """
-        try:
-            # Convertir de formato ISO a formato legible
-            date_obj = datetime.fromisoformat(date_str.replace('Z', '+00:00'))
-            return date_obj.strftime("%d/%m/%Y %H:%M:%S")
-        except (ValueError, AttributeError):
+        if not isinstance(date_str, str):
             return date_str
+        return _format_iso_date(date_str)
     
-    def _generate_metadata_section(self, metadata):
+    def _generate_metadata_section(self, metadata, write):
         """
-        Genera la sección de metadatos para el Markdown.
+        Escribe la sección de metadatos para el Markdown.
         
         Args:
             metadata (dict): Metadatos del JSON
-            
-        Returns:
-            str: Texto Markdown para la sección de metadatos
+            write (callable): Función que recibe cada fragmento de Markdown generado
         """
-        md_text = "# Informe de Noticias SUNASS\n\n"
+        write("# Informe de Noticias SUNASS\n\n")
         
         # Información de fecha y procesamiento
         if "stats_summary" in metadata:
             stats = metadata["stats_summary"]
             
-            md_text += "## Información General\n\n"
+            write("## Información General\n\n")
             
             if "run_timestamp" in stats:
-                md_text += f"**Fecha de procesamiento:** {self._format_date(stats['run_timestamp'])}\n\n"
+                write(f"**Fecha de procesamiento:** {self._format_date(stats['run_timestamp'])}\n\n")
             
             if "date_processed" in stats:
-                md_text += f"**Fecha de datos:** {stats['date_processed']}\n\n"
+                write(f"**Fecha de datos:** {stats['date_processed']}\n\n")
             
             # Estadísticas
-            md_text += "## Estadísticas\n\n"
+            write("## Estadísticas\n\n")
             
             # URLs
             if "total_urls_in_pdf" in stats:
-                md_text += f"**Total de URLs en PDF:** {stats['total_urls_in_pdf']}\n\n"
+                write(f"**Total de URLs en PDF:** {stats['total_urls_in_pdf']}\n\n")
                 
             if "new_urls_processed_count" in stats:
-                md_text += f"**Nuevas URLs procesadas:** {stats['new_urls_processed_count']}\n\n"
+                write(f"**Nuevas URLs procesadas:** {stats['new_urls_processed_count']}\n\n")
                 
             if "history_total_urls" in stats:
-                md_text += f"**Historial total de URLs:** {stats['history_total_urls']}\n\n"
+                write(f"**Historial total de URLs:** {stats['history_total_urls']}\n\n")
             
             # Categorías
             if "categories" in stats:
-                md_text += "### Distribución por Categoría\n\n"
+                write("### Distribución por Categoría\n\n")
                 for category, count in stats["categories"].items():
-                    md_text += f"- **{category.capitalize()}:** {count}\n"
-                md_text += "\n"
-            
-            # Estadísticas de procesamiento HTML
-            if "html_processing" in stats:
-                md_text += "### Procesamiento HTML\n\n"
-                html_stats = stats["html_processing"]
-                for key, value in html_stats.items():
-                    md_text += f"- **{key.replace('_', ' ').capitalize()}:** {value}\n"
-                md_text += "\n"
-            
-            # Estadísticas de procesamiento de imágenes
-            if "image_processing" in stats:
-                md_text += "### Procesamiento de Imágenes\n\n"
-                img_stats = stats["image_processing"]
-                for key, value in img_stats.items():
-                    md_text += f"- **{key.replace('_', ' ').capitalize()}:** {value}\n"
-                md_text += "\n"
-            
-            # Estadísticas de procesamiento de Facebook
-            if "facebook_processing" in stats:
-                md_text += "### Procesamiento de Facebook\n\n"
-                fb_stats = stats["facebook_processing"]
-                for key, value in fb_stats.items():
-                    md_text += f"- **{key.replace('_', ' ').capitalize()}:** {value}\n"
-                md_text += "\n"
-            
-            # Tiempos de procesamiento
-            if "timings_seconds" in stats:
-                md_text += "### Tiempos de Procesamiento (segundos)\n\n"
-                timings = stats["timings_seconds"]
-                for key, value in timings.items():
-                    md_text += f"- **{key.replace('_', ' ').capitalize()}:** {value}\n"
-                md_text += "\n"
-                
-            # Estadísticas de limpieza semántica
-            if "semantic_cleaning" in stats:
-                md_text += "### Limpieza Semántica\n\n"
-                semantic_stats = stats["semantic_cleaning"]
-                for key, value in semantic_stats.items():
-                    if key != "timestamp":
-                        md_text += f"- **{key.replace('_', ' ').capitalize()}:** {value}\n"
-                md_text += "\n"
-        
-        return md_text
+                    write(f"- **{category.capitalize()}:** {count}\n")
+                write("\n")
+            
+            # Estadísticas de procesamiento (HTML, imágenes, Facebook, tiempos, limpieza semántica)
+            for stats_key, header in _STATS_SECTIONS:
+                if stats_key not in stats:
+                    continue
+                write(header)
+                excluded_keys = _STATS_EXCLUDED_KEYS.get(stats_key, ())
+                for key, value in stats[stats_key].items():
+                    if key not in excluded_keys:
+                        write(f"- **{_stats_label(key)}:** {value}\n")
+                write("\n")
     
-    def _generate_pdf_section(self, pdf_data):
+    def _generate_pdf_section(self, pdf_data, write):
         """
-        Genera la sección de contenido PDF para el Markdown.
+        Escribe la sección de contenido PDF para el Markdown.
         
         Args:
             pdf_data (dict): Datos de PDF del JSON
-            
-        Returns:
-            str: Texto Markdown para la sección de PDF
+            write (callable): Función que recibe cada fragmento de Markdown generado
         """
         if not pdf_data:
-            return ""
+            return
             
-        md_text = "## Contenido de PDF\n\n"
+        write("## Contenido de PDF\n\n")
         
         for source_key, paragraphs in pdf_data.items():
-            md_text += f"### {source_key}\n\n"
+            write(f"### {source_key}\n\n")
+            
+            # Sanitizar todos los párrafos de la fuente en un lote antes de darles formato
+            texts = [paragraph.get('text', '') for paragraph in paragraphs]
+            sanitized_texts = self._sanitize_batch(texts)
             
-            for paragraph in paragraphs:
-                text = paragraph.get('text', '')
-                page = paragraph.get('page', '')
+            for paragraph, text, sanitized_text in zip(paragraphs, texts, sanitized_texts):
+                page = paragraph.get('page')
                 
                 if text:
-                    sanitized_text = self._sanitize_text(text)
-                    md_text += f"{sanitized_text}\n\n"
-                    if page:
-                        md_text += f"*Página: {page}*\n\n"
-                    md_text += "---\n\n"
-        
-        return md_text
+                    # Un solo fragmento por párrafo: texto, página (opcional) y separador
+                    page_line = f"*Página: {page}*\n\n" if page else ""
+                    write(f"{sanitized_text}\n\n{page_line}---\n\n")
     
-    def _generate_html_section(self, html_data):
+    def _generate_html_section(self, html_data, write):
         """
-        Genera la sección de contenido HTML para el Markdown.
+        Escribe la sección de contenido HTML para el Markdown.
         
         Args:
             html_data (dict): Datos de HTML del JSON
-            
-        Returns:
-            str: Texto Markdown para la sección de HTML
+            write (callable): Función que recibe cada fragmento de Markdown generado
         """
         if not html_data:
-            return ""
+            return
             
-        md_text = "## Contenido de Páginas Web\n\n"
+        write("## Contenido de Páginas Web\n\n")
         
+        # Extraer los campos a columnas en una sola pasada por el diccionario
+        urls, titles, texts, relevances = [], [], [], []
         for url, page_data in html_data.items():
-            title = page_data.get('metadata', {}).get('title', 'Sin título')
-            text = page_data.get('text', '')
-            relevance = page_data.get('relevance', 0)
-            
-            md_text += f"### {title}\n\n"
-            md_text += f"**URL:** [{url}]({url})\n\n"
-            
-            if relevance:
-                md_text += f"**Relevancia:** {relevance}\n\n"
-                
-            if text:
-                sanitized_text = self._sanitize_text(text)
-                md_text += f"{sanitized_text}\n\n"
-                
-            md_text += "---\n\n"
+            metadata = page_data.get('metadata')
+            urls.append(url)
+            titles.append(metadata.get('title', 'Sin título') if metadata else 'Sin título')
+            texts.append(page_data.get('text', ''))
+            relevances.append(page_data.get('relevance'))
+        
+        # Sanitizar todos los textos de la sección en un lote antes de darles formato
+        sanitized_texts = self._sanitize_batch(texts)
         
-        return md_text
+        for url, title, text, relevance, sanitized_text in zip(urls, titles, texts, relevances, sanitized_texts):
+            # Un solo fragmento por página: título, URL, relevancia y texto (opcionales) y separador
+            relevance_line = f"**Relevancia:** {relevance}\n\n" if relevance else ""
+            text_line = f"{sanitized_text}\n\n" if text else ""
+            write(f"### {title}\n\n**URL:** [{url}]({url})\n\n{relevance_line}{text_line}---\n\n")
     
-    def _generate_image_section(self, image_data):
+    def _generate_image_section(self, image_data, write):
         """
-        Genera la sección de contenido de imágenes para el Markdown.
+        Escribe la sección de contenido de imágenes para el Markdown.
         
         Args:
             image_data (dict): Datos de imágenes del JSON
-            
-        Returns:
-            str: Texto Markdown para la sección de imágenes
+            write (callable): Función que recibe cada fragmento de Markdown generado
         """
         if not image_data:
-            return ""
+            return
             
-        md_text = "## Contenido de Imágenes\n\n"
+        write("## Contenido de Imágenes\n\n")
         
+        # Extraer los campos a columnas en una sola pasada por el diccionario
+        urls, filenames, texts = [], [], []
         for image_key, image_info in image_data.items():
-            extracted_text = image_info.get('extracted_text', '')
-            url = image_info.get('url', image_key)
-
-            md_text += f"### Imagen: {image_info.get('image_filename', image_key)}\n\n"
-            md_text += f"**URL:** [{url}]({url})\n\n"
-                
-            if extracted_text:
-                sanitized_text = self._sanitize_text(extracted_text)
-                md_text += f"{sanitized_text}\n\n"
-                
-            md_text += "---\n\n"
+            urls.append(image_info.get('url', image_key))
+            filenames.append(image_info.get('image_filename', image_key))
+            texts.append(image_info.get('extracted_text', ''))
         
-        return md_text
+        # Sanitizar todos los textos de la sección en un lote antes de darles formato
+        sanitized_texts = self._sanitize_batch(texts)
+        
+        for url, image_filename, extracted_text, sanitized_text in zip(urls, filenames, texts, sanitized_texts):
+            # Un solo fragmento por imagen: nombre, URL, texto (opcional) y separador
+            text_line = f"{sanitized_text}\n\n" if extracted_text else ""
+            write(f"### Imagen: {image_filename}\n\n**URL:** [{url}]({url})\n\n{text_line}---\n\n")
 
-    def _generate_facebook_section(self, facebook_data):
+    def _generate_facebook_section(self, facebook_data, write):
         """
-        Genera la sección de contenido de Facebook para el Markdown.
+        Escribe la sección de contenido de Facebook para el Markdown.
         
         Args:
             facebook_data (dict): Datos de Facebook del JSON
-            
-        Returns:
-            str: Texto Markdown para la sección de Facebook
+            write (callable): Función que recibe cada fragmento de Markdown generado
         """
         if not facebook_data:
-            return ""
+            return
             
-        md_text = "## Contenido de Redes Sociales\n\n"
+        write("## Contenido de Redes Sociales\n\n")
         
-        for fb_key, fb_info in facebook_data.items():
-            text = fb_info.get('extracted_text', '')
-            
-            md_text += f"### Publicación\n\n"
-            md_text += f"**Fuente:** {fb_key}\n\n"
-                
-            if text:
-                sanitized_text = self._sanitize_text(text)
-                md_text += f"{sanitized_text}\n\n"
-                
-            md_text += "---\n\n"
+        # Sanitizar todos los textos de la sección en un lote antes de darles formato
+        texts = [fb_info.get('extracted_text', '') for fb_info in facebook_data.values()]
+        sanitized_texts = self._sanitize_batch(texts)
+        
+        for fb_key, text, sanitized_text in zip(facebook_data, texts, sanitized_texts):
+            # Un solo fragmento por publicación: fuente, texto (opcional) y separador
+            text_line = f"{sanitized_text}\n\n" if text else ""
+            write(f"### Publicación\n\n**Fuente:** {fb_key}\n\n{text_line}---\n\n")
+    
+    def _write_sections(self, json_data, write):
+        """
+        Escribe todas las secciones del Markdown en orden mediante `write`.
+        Con muchos elementos, las secciones de contenido se generan en paralelo
+        (cada una en su propio buffer) y se escriben luego en el orden original.
+        
+        Args:
+            json_data (dict): Datos JSON a convertir
+            write (callable): Función que recibe cada fragmento de Markdown generado
+        """
+        # Sección de metadatos
+        if "metadata" in json_data:
+            self._generate_metadata_section(json_data["metadata"], write)
+        
+        # Sección de contenido
+        if "extracted_content" not in json_data:
+            return
+        content = json_data["extracted_content"]
+        
+        # PDF, HTML, imágenes y Facebook, en ese orden
+        sections = [
+            (generate, content[key])
+            for key, generate in (
+                ("pdf_paragraphs", self._generate_pdf_section),
+                ("html_pages", self._generate_html_section),
+                ("image_texts", self._generate_image_section),
+                ("facebook_texts", self._generate_facebook_section)
+            )
+            if key in content and content[key]
+        ]
+        
+        total_items = sum(len(data) for _, data in sections)
+        if len(sections) < 2 or total_items < PARALLEL_SECTIONS_MIN_ITEMS:
+            for generate, data in sections:
+                generate(data, write)
+            return
         
-        return md_text
+        def render(generate, data):
+            buffer = io.StringIO()
+            generate(data, buffer.write)
+            return buffer.getvalue()
+        
+        with ThreadPoolExecutor(max_workers=len(sections)) as executor:
+            futures = [executor.submit(render, generate, data) for generate, data in sections]
+            for future in futures:
+                write(future.result())
     
-    def convert_to_markdown(self, json_data, output_path=None):
+    def convert_to_markdown(self, json_data, output_path=None, return_content=False):
         """
         Convierte datos JSON a formato Markdown.
         
+        Si se indica `output_path`, las secciones se escriben directamente al archivo
+        (con un buffer amplio) a medida que se generan, sin construir el documento
+        completo en memoria.
+        
         Args:
             json_data (dict): Datos JSON a convertir
             output_path (str, optional): Ruta del archivo de salida
+            return_content (bool): Con `output_path`, retornar también el contenido generado
             
         Returns:
-            str: Contenido en formato Markdown
+            str: Contenido en formato Markdown (cadena vacía si se escribió a
+                 `output_path` sin `return_content`)
         """
         if not isinstance(json_data, dict):
             logger.error("Los datos JSON no tienen el formato esperado")
             return ""
-            
-        # Generar secciones de Markdown
-        md_content = ""
         
-        # Sección de metadatos
-        if "metadata" in json_data:
-            md_content += self._generate_metadata_section(json_data["metadata"])
-        
-        # Sección de contenido
-        if "extracted_content" in json_data:
-            content = json_data["extracted_content"]
-            
-            # PDF
-            if "pdf_paragraphs" in content and content["pdf_paragraphs"]:
-                md_content += self._generate_pdf_section(content["pdf_paragraphs"])
-            
-            # HTML
-            if "html_pages" in content and content["html_pages"]:
-                md_content += self._generate_html_section(content["html_pages"])
-            
-            # Imágenes
-            if "image_texts" in content and content["image_texts"]:
-                md_content += self._generate_image_section(content["image_texts"])
-            
-            # Facebook
-            if "facebook_texts" in content and content["facebook_texts"]:
-                md_content += self._generate_facebook_section(content["facebook_texts"])
+        # Sin archivo de salida: generar el contenido en memoria
+        if not output_path:
+            buffer = io.StringIO()
+            self._write_sections(json_data, buffer.write)
+            return buffer.getvalue()
         
-        # Guardar en archivo si se proporciona una ruta
-        if output_path:
-            try:
-                with open(output_path, 'w', encoding='utf-8') as f:
-                    f.write(md_content)
-                logger.info(f"Archivo Markdown guardado en: {output_path}")
-            except Exception as e:
-                logger.error(f"Error al guardar el archivo Markdown: {str(e)}")
+        buffer = io.StringIO() if return_content else None
+        try:
+            with open(output_path, 'w', encoding='utf-8', buffering=MD_WRITE_BUFFER_SIZE) as f:
+                if buffer is None:
+                    write = f.write
+                else:
+                    def write(chunk):
+                        f.write(chunk)
+                        buffer.write(chunk)
+                self._write_sections(json_data, write)
+            logger.info(f"Archivo Markdown guardado en: {output_path}")
+        except Exception as e:
+            logger.error(f"Error al guardar el archivo Markdown: {str(e)}")
         
-        return md_content
+        return buffer.getvalue() if buffer is not None else ""
@@ -13,6 +13,7 @@ Opciones:
     --output-md RUTA     Ruta para guardar el archivo Markdown de salida
     --threshold FLOAT    Umbral de similitud (entre 0.0 y 1.0, por defecto 0.7)
     --language IDIOMA    Idioma para el análisis ('spanish' o 'english', por defecto 'spanish')
+    --preprocess-cache RUTA  Base SQLite para reutilizar el texto preprocesado entre ejecuciones
 """
 
 import os
@@ -20,18 +21,25 @@ import sys
 import json
 import argparse
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
 from .semantic_cleaner import SemanticCleaner
 from .markdown_converter import MarkdownConverter
 
-# Configuración de logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
+# Logger del módulo (basicConfig se aplica solo al ejecutarlo como script)
 logger = logging.getLogger('run_semantic_cleaner')
 
+# orjson es opcional: parsea y serializa JSON en C, varias veces más rápido que json
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+# Buffer de escritura de los archivos JSON (1 MB)
+JSON_WRITE_BUFFER_SIZE = 1 << 20
+
 def parse_arguments():
     """
     Parsea los argumentos de línea de comandos.
@@ -74,6 +82,12 @@ def parse_arguments():
         help="Idioma para el análisis ('spanish' o 'english', por defecto 'spanish')"
     )
     
+    parser.add_argument(
+        "--preprocess-cache",
+        type=str,
+        help="Base SQLite para reutilizar el texto preprocesado entre ejecuciones"
+    )
+    
     return parser.parse_args()
 
 def load_json(json_path):
@@ -87,8 +101,12 @@ def load_json(json_path):
         dict: Datos JSON cargados o None si hay error
     """
     try:
-        with open(json_path, 'r', encoding='utf-8') as f:
-            return json.load(f)
+        # Leer bytes: tanto orjson como json decodifican UTF-8 en C, sin un str intermedio del archivo
+        with open(json_path, 'rb') as f:
+            raw = f.read()
+        if ORJSON_AVAILABLE:
+            return orjson.loads(raw)
+        return json.loads(raw)
     except Exception as e:
         logger.error(f"Error al cargar el archivo JSON: {str(e)}")
         return None
@@ -105,8 +123,18 @@ def save_json(data, json_path):
         bool: True si se guarda correctamente, False en caso contrario
     """
     try:
-        with open(json_path, 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
+        if ORJSON_AVAILABLE:
+            # orjson emite UTF-8 sin escapar (equivalente a ensure_ascii=False) e indenta en Rust
+            serialized = orjson.dumps(
+                data, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+            )
+        else:
+            # Con indent, json usa su codificador en Python puro; sin indent usa el de C.
+            # Solo se indenta en modo depuración.
+            indent = 2 if logger.isEnabledFor(logging.DEBUG) else None
+            serialized = json.dumps(data, ensure_ascii=False, indent=indent).encode('utf-8')
+        with open(json_path, 'wb', buffering=JSON_WRITE_BUFFER_SIZE) as f:
+            f.write(serialized)
         return True
     except Exception as e:
         logger.error(f"Error al guardar el archivo JSON: {str(e)}")
@@ -151,7 +179,7 @@ def main(args=None):
         return
     
     # Cargar archivo JSON
-    logger.info(f"Cargando archivo JSON: {args.input_json}")
+    logger.info(f"Cargando archivo JSON: {args.input_json} (backend: {'orjson' if ORJSON_AVAILABLE else 'json'})")
     json_data = load_json(args.input_json)
     
     if json_data is None:
@@ -173,29 +201,41 @@ def main(args=None):
     # Inicializar limpiador semántico
     cleaner = SemanticCleaner(
         similarity_threshold=args.threshold,
-        language=args.language
+        language=args.language,
+        preprocess_cache_path=getattr(args, "preprocess_cache", None)
     )
     
     # Realizar limpieza semántica
     logger.info("Realizando limpieza semántica...")
     cleaned_json = cleaner.clean_consolidated_json(json_data)
     
+    # Liberar el JSON original: los textos descartados no se necesitan para guardar ni convertir
+    del json_data
+    
     if cleaned_json is None:
         logger.error("Error en la limpieza semántica")
         return
     
-    # Guardar JSON limpio
+    # Guardar JSON limpio en segundo plano mientras se genera el Markdown
+    # (ambos solo leen cleaned_json, que ya no se modifica)
     logger.info(f"Guardando JSON limpio en: {output_json}")
-    if not save_json(cleaned_json, output_json):
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        save_future = executor.submit(save_json, cleaned_json, output_json)
+        
+        # Convertir a Markdown
+        logger.info("Convirtiendo a formato Markdown...")
+        markdown_converter = MarkdownConverter()
+        markdown_converter.convert_to_markdown(cleaned_json, output_md)
+    
+    if not save_future.result():
         logger.error("Error al guardar el archivo JSON limpio")
         return
     
-    # Convertir a Markdown
-    logger.info("Convirtiendo a formato Markdown...")
-    markdown_converter = MarkdownConverter()
-    markdown_converter.convert_to_markdown(cleaned_json, output_md)
-    
     logger.info("Proceso completado con éxito")
 
 if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
     main()
@@ -7,32 +7,55 @@ import logging
 import os
 from datetime import datetime
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+
+import numpy as np
+from scipy import sparse
+from scipy.sparse.csgraph import connected_components
 
 from .text_similarity import SimilarityAnalyzer
 
-# Configuración de logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
+# Logger del módulo (el punto de entrada configura el logging)
 logger = logging.getLogger('semantic_cleaner')
 
+# Umbral de similitud (más estricto) entre dos publicaciones de Facebook
+FACEBOOK_SIMILARITY_THRESHOLD = 0.85
+
+@dataclass(slots=True)
+class TextItem:
+    """
+    Texto extraído de una fuente (pdf, html, image o facebook) junto con los
+    metadatos necesarios para agruparlo y reconstruir el JSON limpio.
+    """
+    source: str
+    source_key: str
+    text: str
+    relevance_score: float
+    page: int = 0
+    title: str = ''
+    description: str = ''
+    url: str = ''
+    perceptual_hash: str = ''
+
 class SemanticCleaner:
     """
     Clase para limpiar semánticamente textos extraídos de diferentes fuentes.
     """
     
-    def __init__(self, similarity_threshold=0.7, language='spanish'):
+    def __init__(self, similarity_threshold=0.7, language='spanish', preprocess_cache_path=None):
         """
         Inicializa el limpiador semántico.
         
         Args:
             similarity_threshold (float): Umbral de similitud para considerar textos como similares
             language (str): Idioma para el análisis ('spanish' o 'english')
+            preprocess_cache_path (str, optional): Ruta de la base SQLite de textos preprocesados
         """
         self.similarity_analyzer = SimilarityAnalyzer(
             language=language,
-            similarity_threshold=similarity_threshold
+            similarity_threshold=similarity_threshold,
+            preprocess_cache_path=preprocess_cache_path
         )
         self.similarity_threshold = similarity_threshold
         
@@ -44,7 +67,7 @@ class SemanticCleaner:
             pdf_data (dict): Datos de PDF
             
         Returns:
-            list: Lista de textos extraídos
+            list: Lista de TextItem extraídos
         """
         texts = []
         
@@ -56,16 +79,14 @@ class SemanticCleaner:
             for paragraph in paragraphs:
                 text = paragraph.get('text', '')
                 if text:
-                    texts.append({
-                        'source': 'pdf',
-                        'source_key': source_key,
-                        'text': text,
-                        'metadata': {
-                            'page': paragraph.get('page', 0),
-                            'description': paragraph.get('metadata', {}).get('description', '')
-                        },
-                        'relevance_score': 1.0  # Los textos PDF se consideran altamente relevantes
-                    })
+                    texts.append(TextItem(
+                        source='pdf',
+                        source_key=source_key,
+                        text=text,
+                        relevance_score=1.0,  # Los textos PDF se consideran altamente relevantes
+                        page=paragraph.get('page', 0),
+                        description=paragraph.get('metadata', {}).get('description', '')
+                    ))
         
         return texts
     
@@ -77,7 +98,7 @@ class SemanticCleaner:
             html_data (dict): Datos de HTML
             
         Returns:
-            list: Lista de textos extraídos
+            list: Lista de TextItem extraídos
         """
         texts = []
         
@@ -88,17 +109,15 @@ class SemanticCleaner:
         for url, page_data in html_data.items():
             text = page_data.get('text', '')
             if text:
-                texts.append({
-                    'source': 'html',
-                    'source_key': url,
-                    'text': text,
-                    'metadata': {
-                        'title': page_data.get('metadata', {}).get('title', ''),
-                        'description': page_data.get('metadata', {}).get('description', ''),
-                        'url': url
-                    },
-                    'relevance_score': page_data.get('relevance', 0.0)
-                })
+                texts.append(TextItem(
+                    source='html',
+                    source_key=url,
+                    text=text,
+                    relevance_score=page_data.get('relevance', 0.0),
+                    title=page_data.get('metadata', {}).get('title', ''),
+                    description=page_data.get('metadata', {}).get('description', ''),
+                    url=url
+                ))
         
         return texts
     
@@ -110,7 +129,7 @@ class SemanticCleaner:
             image_data (dict or list): Datos de imágenes (puede ser diccionario o lista)
             
         Returns:
-            list: Lista de textos extraídos
+            list: Lista de TextItem extraídos
         """
         texts = []
         
@@ -141,17 +160,21 @@ class SemanticCleaner:
                                          image_info.get('filename', 
                                                      image_info.get('url', 'unknown_image')))
                 
-                texts.append({
-                    'source': 'image',
-                    'source_key': identifier,
-                    'text': text,
-                    'metadata': {
-                        'url': identifier,
-                        'description': image_info.get('description', ''),
-                        'perceptual_hash': image_info.get('perceptual_hash', '')
-                    },
-                    'relevance_score': 0.5  # Valor predeterminado para textos de imágenes
-                })
+                # El procesador de imágenes guarda el pHash como entero y su forma hexadecimal
+                # en 'perceptual_hash_hex'; los resultados antiguos lo guardaban ya como texto
+                perceptual_hash = image_info.get('perceptual_hash_hex') or image_info.get('perceptual_hash') or ''
+                if isinstance(perceptual_hash, int):
+                    perceptual_hash = f"{perceptual_hash:016x}"
+                
+                texts.append(TextItem(
+                    source='image',
+                    source_key=identifier,
+                    text=text,
+                    relevance_score=0.5,  # Valor predeterminado para textos de imágenes
+                    description=image_info.get('description', ''),
+                    url=identifier,
+                    perceptual_hash=perceptual_hash
+                ))
         
         return texts
     
@@ -163,7 +186,7 @@ class SemanticCleaner:
             facebook_data (dict): Datos de Facebook
             
         Returns:
-            list: Lista de textos extraídos
+            list: Lista de TextItem extraídos
         """
         texts = []
         
@@ -174,16 +197,14 @@ class SemanticCleaner:
         for fb_key, fb_info in facebook_data.items():
             text = fb_info.get('extracted_text', '')
             if text:
-                texts.append({
-                    'source': 'facebook',
-                    'source_key': fb_key,
-                    'text': text,
-                    'metadata': {
-                        'url': fb_key,
-                        'description': fb_info.get('metadata', {}).get('description', '')
-                    },
-                    'relevance_score': 0.4  # Valor predeterminado para textos de Facebook
-                })
+                texts.append(TextItem(
+                    source='facebook',
+                    source_key=fb_key,
+                    text=text,
+                    relevance_score=0.4,  # Valor predeterminado para textos de Facebook
+                    description=fb_info.get('metadata', {}).get('description', ''),
+                    url=fb_key
+                ))
         
         return texts
     
@@ -192,7 +213,7 @@ class SemanticCleaner:
         Agrupa textos similares.
         
         Args:
-            texts (list): Lista de diccionarios de textos
+            texts (list): Lista de TextItem
             
         Returns:
             list: Lista de grupos de textos similares
@@ -200,34 +221,45 @@ class SemanticCleaner:
         if not texts:
             return []
             
-        # Inicializar grupos
-        groups = []
-        processed_indices = set()
-        
-        # Agrupar textos similares
-        for i, text_item in enumerate(texts):
-            if i in processed_indices:
-                continue
-                
-            # Crear nuevo grupo
-            current_group = [text_item]
-            processed_indices.add(i)
-            
-            # Buscar textos similares
-            for j, other_text_item in enumerate(texts):
-                if j in processed_indices or i == j:
-                    continue
-                    
-                # Verificar similitud con umbral ajustado para Facebook
-                similarity_threshold = self.similarity_threshold
-                if text_item['source'] == 'facebook' and other_text_item['source'] == 'facebook':
-                    similarity_threshold = 0.85  # Umbral más alto para Facebook
-                if self.similarity_analyzer.is_similar(text_item['text'], other_text_item['text'], threshold=similarity_threshold):
-                    current_group.append(other_text_item)
-                    processed_indices.add(j)
-            
-            # Agregar grupo a la lista de grupos
-            groups.append(current_group)
+        # Colapsar textos idénticos: la similitud se calcula una sola vez por texto único
+        unique_index = {}
+        text_nodes = [unique_index.setdefault(text_item.text, len(unique_index)) for text_item in texts]
+        n_unique = len(unique_index)
+        
+        # Por texto único: si alguna aparición es de Facebook y si alguna es de otra fuente
+        has_facebook = np.zeros(n_unique, dtype=bool)
+        has_other = np.zeros(n_unique, dtype=bool)
+        for text_item, node in zip(texts, text_nodes):
+            if text_item.source == 'facebook':
+                has_facebook[node] = True
+            else:
+                has_other[node] = True
+        
+        # Calcular todas las similitudes de una vez (un solo ajuste TF-IDF)
+        similarity_matrix = self.similarity_analyzer.pairwise_similarity_matrix(list(unique_index)).tocoo()
+        
+        # Grafo de similitud: arista si la similitud supera el umbral del par
+        # (entre dos publicaciones de Facebook se exige un umbral más alto); entre textos
+        # únicos se aplica el umbral menos exigente de los pares de apariciones que representan
+        rows, cols = similarity_matrix.row, similarity_matrix.col
+        pair_thresholds = np.where(has_other[rows] | has_other[cols], self.similarity_threshold, np.inf)
+        pair_thresholds = np.where(
+            has_facebook[rows] & has_facebook[cols],
+            np.minimum(pair_thresholds, FACEBOOK_SIMILARITY_THRESHOLD),
+            pair_thresholds
+        )
+        is_edge = similarity_matrix.data >= pair_thresholds
+        adjacency = sparse.coo_matrix(
+            (np.ones(is_edge.sum(), dtype=np.int8), (rows[is_edge], cols[is_edge])),
+            shape=(n_unique, n_unique)
+        ).tocsr()
+        
+        # Cada componente conexa es un grupo (etiquetas en orden de primera aparición);
+        # los textos idénticos comparten nodo y quedan en el mismo grupo
+        n_groups, labels = connected_components(adjacency, directed=False)
+        groups = [[] for _ in range(n_groups)]
+        for text_item, node in zip(texts, text_nodes):
+            groups[labels[node]].append(text_item)
         
         return groups
     
@@ -239,7 +271,7 @@ class SemanticCleaner:
             group (list): Grupo de textos similares
             
         Returns:
-            dict: Texto seleccionado como representativo
+            TextItem: Texto seleccionado como representativo
         """
         if not group:
             return None
@@ -247,15 +279,9 @@ class SemanticCleaner:
         if len(group) == 1:
             return group[0]
             
-        # Ordenar por relevancia (descendente) y longitud (descendente)
-        sorted_group = sorted(
-            group, 
-            key=lambda x: (x['relevance_score'], len(x['text'])), 
-            reverse=True
-        )
-        
-        # Seleccionar el mejor
-        return sorted_group[0]
+        # Seleccionar el de mayor relevancia y, a igual relevancia, el más largo
+        # (max conserva el primero en caso de empate, igual que el orden estable)
+        return max(group, key=lambda x: (x.relevance_score, len(x.text)))
     
     def _create_cleaned_output(self, representative_texts, original_json):
         """
@@ -279,23 +305,25 @@ class SemanticCleaner:
             }
         }
         
+        # Índice (fuente, texto) -> párrafo original; conserva el primer párrafo con ese texto
+        original_pdf = original_json["extracted_content"].get("pdf_paragraphs", {})
+        pdf_index = {}
+        for original_key, paragraphs in original_pdf.items():
+            for paragraph in paragraphs:
+                pdf_index.setdefault((original_key, paragraph.get('text')), paragraph)
+        
         # Organizar textos representativos por fuente
         for text_item in representative_texts:
-            source = text_item['source']
-            source_key = text_item['source_key']
+            source = text_item.source
+            source_key = text_item.source_key
             
             if source == 'pdf':
-                # Buscar el párrafo original en el JSON original
-                for original_key, paragraphs in original_json["extracted_content"]["pdf_paragraphs"].items():
-                    if original_key == source_key:
-                        if source_key not in cleaned_json["extracted_content"]["pdf_paragraphs"]:
-                            cleaned_json["extracted_content"]["pdf_paragraphs"][source_key] = []
-                        
-                        # Encontrar el párrafo específico
-                        for paragraph in paragraphs:
-                            if paragraph.get('text') == text_item['text']:
-                                cleaned_json["extracted_content"]["pdf_paragraphs"][source_key].append(paragraph)
-                                break
+                # Buscar el párrafo original en el índice
+                if source_key in original_pdf:
+                    cleaned_paragraphs = cleaned_json["extracted_content"]["pdf_paragraphs"].setdefault(source_key, [])
+                    paragraph = pdf_index.get((source_key, text_item.text))
+                    if paragraph is not None:
+                        cleaned_paragraphs.append(paragraph)
             
             elif source == 'html':
                 url = source_key
@@ -339,32 +367,27 @@ class SemanticCleaner:
             logger.error("No se encontró la sección 'extracted_content' en el JSON")
             return None
         
-        # Extraer textos de todas las fuentes
+        # Extraer textos de todas las fuentes (PDF, HTML, imágenes y Facebook) en paralelo;
+        # los extractores solo leen su propia sección del JSON
+        extracted_content = json_data["extracted_content"]
+        extractors = [
+            ("pdf_paragraphs", self._extract_texts_from_pdf, "PDF"),
+            ("html_pages", self._extract_texts_from_html, "HTML"),
+            ("image_texts", self._extract_texts_from_images, "imágenes"),
+            ("facebook_texts", self._extract_texts_from_facebook, "Facebook")
+        ]
+        with ThreadPoolExecutor(max_workers=len(extractors)) as executor:
+            futures = [
+                (executor.submit(extract, extracted_content.get(key, {})), label)
+                for key, extract, label in extractors
+            ]
+        
+        # Unir los resultados en el orden original de las fuentes
         all_texts = []
-        
-        # PDF
-        pdf_data = json_data["extracted_content"].get("pdf_paragraphs", {})
-        pdf_texts = self._extract_texts_from_pdf(pdf_data)
-        all_texts.extend(pdf_texts)
-        logger.info(f"Extraídos {len(pdf_texts)} textos de PDF")
-        
-        # HTML
-        html_data = json_data["extracted_content"].get("html_pages", {})
-        html_texts = self._extract_texts_from_html(html_data)
-        all_texts.extend(html_texts)
-        logger.info(f"Extraídos {len(html_texts)} textos de HTML")
-        
-        # Imágenes
-        image_data = json_data["extracted_content"].get("image_texts", {})
-        image_texts = self._extract_texts_from_images(image_data)
-        all_texts.extend(image_texts)
-        logger.info(f"Extraídos {len(image_texts)} textos de imágenes")
-        
-        # Facebook
-        facebook_data = json_data["extracted_content"].get("facebook_texts", {})
-        facebook_texts = self._extract_texts_from_facebook(facebook_data)
-        all_texts.extend(facebook_texts)
-        logger.info(f"Extraídos {len(facebook_texts)} textos de Facebook")
+        for future, label in futures:
+            source_texts = future.result()
+            all_texts.extend(source_texts)
+            logger.info(f"Extraídos {len(source_texts)} textos de {label}")
         
         # Agrupar textos similares
         text_groups = self._group_similar_texts(all_texts)
@@ -2,16 +2,57 @@
 Módulo para analizar la similitud entre textos utilizando diferentes técnicas NLP.
 """
 
+import hashlib
+import logging
+import os
 import re
+import sqlite3
 import string
+import threading
+from functools import lru_cache
 import numpy as np
-from sklearn.feature_extraction.text import TfidfVectorizer
+from scipy import sparse
+from sklearn.feature_extraction.text import HashingVectorizer, TfidfTransformer, TfidfVectorizer
+from sklearn.decomposition import TruncatedSVD
 from sklearn.metrics.pairwise import cosine_similarity
+from sklearn.preprocessing import normalize
 import nltk
 from nltk.corpus import stopwords
 from nltk.tokenize import word_tokenize
 from nltk.stem import SnowballStemmer
 
+# snowballstemmer es opcional: aplica el stemmer Snowball a todos los tokens en una llamada
+# (con PyStemmer instalado, en C); si no está, se usa el SnowballStemmer de NLTK
+try:
+    import snowballstemmer
+    SNOWBALLSTEMMER_AVAILABLE = True
+except ImportError:
+    SNOWBALLSTEMMER_AVAILABLE = False
+
+# datasketch es opcional: con muchos textos, MinHash-LSH propone los pares candidatos
+# y solo para ellos se calcula el coseno, en lugar de comparar todos contra todos
+try:
+    from datasketch import MinHash, MinHashLSH
+    DATASKETCH_AVAILABLE = True
+except ImportError:
+    DATASKETCH_AVAILABLE = False
+
+# hnswlib es opcional: con corpus muy grandes, un índice HNSW sobre la proyección SVD
+# de las filas TF-IDF encuentra los vecinos de cada texto en tiempo sublineal
+try:
+    import hnswlib
+    HNSWLIB_AVAILABLE = True
+except ImportError:
+    HNSWLIB_AVAILABLE = False
+
+# torch es opcional: con una GPU CUDA, el producto X·Xᵀ de la proyección SVD se calcula
+# por bloques en la GPU (FP16) para proponer los pares candidatos
+try:
+    import torch
+    TORCH_CUDA_AVAILABLE = torch.cuda.is_available()
+except ImportError:
+    TORCH_CUDA_AVAILABLE = False
+
 # Descargar recursos necesarios de NLTK (si no están ya descargados)
 def download_nltk_resources():
     resources = ['punkt', 'stopwords']
@@ -28,24 +69,151 @@ def download_nltk_resources():
 # Descargar los recursos necesarios
 download_nltk_resources()
 
+# Número máximo de textos preprocesados que se conservan en memoria por analizador
+PREPROCESS_CACHE_SIZE = 100_000
+
+# Dimensión del espacio de hashing de términos (sin vocabulario que construir)
+HASHING_N_FEATURES = 2 ** 18
+
+# Prefiltro de pares candidatos (solo con datasketch y a partir de LSH_MIN_TEXTS textos):
+# Jaccard aproximado sobre n-gramas de caracteres y razón mínima de longitudes
+LSH_MIN_TEXTS = 2000
+LSH_JACCARD_THRESHOLD = 0.5
+MINHASH_NUM_PERM = 128
+CHAR_SHINGLE_SIZE = 4
+MIN_LENGTH_RATIO = 0.3
+
+# Búsqueda de vecinos aproximada (solo con hnswlib y a partir de ANN_MIN_TEXTS textos)
+ANN_MIN_TEXTS = 20000
+ANN_DIMENSIONS = 128
+ANN_NEIGHBORS = 50
+ANN_EF_CONSTRUCTION = 200
+ANN_M = 16
+
+# Producto en GPU: filas por bloque y margen bajo el umbral con que se proponen candidatos
+# (la similitud de la proyección es aproximada; la definitiva se calcula sobre TF-IDF)
+GPU_BLOCK_ROWS = 4096
+GPU_CANDIDATE_MARGIN = 0.1
+
+@lru_cache(maxsize=None)
+def _stopword_set(language):
+    """Stopwords de NLTK de un idioma, leídas una sola vez y compartidas entre analizadores."""
+    return frozenset(stopwords.words(language))
+
+# Tabla de traducción para eliminar la puntuación (construida una sola vez)
+_PUNCT_TABLE = str.maketrans('', '', string.punctuation)
+
+# Caché en disco del preprocesado: tamaño de la huella BLAKE2b y claves por consulta SQLite
+PREPROCESS_DIGEST_SIZE = 16
+PREPROCESS_QUERY_BATCH = 500
+
+logger = logging.getLogger('text_similarity')
+
+def _svd_projection(tfidf_matrix):
+    """
+    Proyecta las filas TF-IDF a ANN_DIMENSIONS dimensiones con TruncatedSVD y las
+    normaliza (L2), de modo que el producto escalar aproxima la similitud coseno.
+    """
+    vectors = TruncatedSVD(n_components=ANN_DIMENSIONS).fit_transform(tfidf_matrix)
+    return normalize(vectors, norm='l2', copy=False).astype(np.float32)
+
+def _pair_similarity_matrix(tfidf_matrix, pairs):
+    """
+    Construye la matriz de similitud (N x N, simétrica) de un conjunto de pares (i, j)
+    con i < j, calculando el coseno por fila sobre las filas TF-IDF normalizadas (L2).
+    """
+    n_texts = tfidf_matrix.shape[0]
+    if not pairs:
+        return sparse.csr_matrix((n_texts, n_texts))
+    
+    pairs = sorted(pairs)
+    rows = np.array([i for i, _ in pairs])
+    cols = np.array([j for _, j in pairs])
+    similarities = np.asarray(tfidf_matrix[rows].multiply(tfidf_matrix[cols]).sum(axis=1)).ravel()
+    return sparse.coo_matrix(
+        (np.concatenate([similarities, similarities]), (np.concatenate([rows, cols]), np.concatenate([cols, rows]))),
+        shape=(n_texts, n_texts)
+    ).tocsr()
+
+class PreprocessCache:
+    """
+    Caché SQLite del texto preprocesado (sin puntuación ni stopwords, con stemming),
+    indexado por la huella BLAKE2b del idioma y el texto original. Segura entre hilos.
+    """
+    
+    def __init__(self, db_path):
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, timeout=30, check_same_thread=False)
+        self._conn.execute("CREATE TABLE IF NOT EXISTS preprocessed_texts(key BLOB PRIMARY KEY, value TEXT)")
+        self._conn.commit()
+    
+    def get_many(self, keys):
+        """Retorna {clave: texto preprocesado} para las claves presentes en la caché."""
+        found = {}
+        unique_keys = list(set(keys))
+        with self._lock:
+            for start in range(0, len(unique_keys), PREPROCESS_QUERY_BATCH):
+                batch = unique_keys[start:start + PREPROCESS_QUERY_BATCH]
+                placeholders = ",".join("?" * len(batch))
+                found.update(self._conn.execute(
+                    f"SELECT key, value FROM preprocessed_texts WHERE key IN ({placeholders})", batch
+                ))
+        return found
+    
+    def put_many(self, rows):
+        """Guarda (o reemplaza) pares (clave, texto preprocesado)."""
+        if not rows:
+            return
+        with self._lock:
+            self._conn.executemany("INSERT OR REPLACE INTO preprocessed_texts VALUES (?, ?)", rows)
+            self._conn.commit()
+    
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
 class SimilarityAnalyzer:
     """
     Clase para analizar la similitud semántica entre textos.
     """
     
-    def __init__(self, language='spanish', similarity_threshold=0.7):
+    def __init__(self, language='spanish', similarity_threshold=0.7, preprocess_cache_path=None):
         """
         Inicializa el analizador de similitud.
         
         Args:
             language (str): Idioma para stopwords y stemming ('spanish' o 'english')
             similarity_threshold (float): Umbral de similitud para considerar textos como similares
+            preprocess_cache_path (str, optional): Ruta de una base SQLite donde reutilizar
+                                                   el texto preprocesado entre ejecuciones
         """
         self.language = language
         self.similarity_threshold = similarity_threshold
-        self.stemmer = SnowballStemmer(language)
-        self.stop_words = set(stopwords.words(language))
-        self.vectorizer = TfidfVectorizer(stop_words=self.stop_words)
+        if SNOWBALLSTEMMER_AVAILABLE:
+            self.stemmer = snowballstemmer.stemmer(language)
+        else:
+            self.stemmer = SnowballStemmer(language)
+        self.stop_words = _stopword_set(language)
+        self.vectorizer = TfidfVectorizer(stop_words=list(self.stop_words))
+        self.hashing_vectorizer = HashingVectorizer(
+            n_features=HASHING_N_FEATURES,
+            alternate_sign=False,
+            norm=None,
+            stop_words=list(self.stop_words),
+            dtype=np.float32
+        )
+        # Caché por instancia: el resultado depende del stemmer y las stopwords del idioma
+        self._preprocess_cached = lru_cache(maxsize=PREPROCESS_CACHE_SIZE)(self._preprocess)
+        
+        self.preprocess_cache = None
+        if preprocess_cache_path:
+            try:
+                self.preprocess_cache = PreprocessCache(preprocess_cache_path)
+            except sqlite3.Error as e:
+                logger.warning(f"No se pudo abrir la caché de preprocesado {preprocess_cache_path}: {e}")
         
     def preprocess_text(self, text):
         """
@@ -59,22 +227,72 @@ class SimilarityAnalyzer:
         """
         if not text or not isinstance(text, str):
             return ""
+        
+        return self._preprocess_cached(text)
+    
+    def _preprocess(self, text):
+        """
+        Preprocesa un texto no vacío (sin caché).
+        
+        Args:
+            text (str): Texto a preprocesar
             
+        Returns:
+            str: Texto preprocesado
+        """
         # Convertir a minúsculas
         text = text.lower()
         
         # Eliminar puntuación
-        text = text.translate(str.maketrans('', '', string.punctuation))
+        text = text.translate(_PUNCT_TABLE)
         
         # Tokenizar de manera simple, evitando nltk.word_tokenize por el error de punkt_tab
         tokens = text.split()
         
         # Eliminar stopwords y aplicar stemming
-        tokens = [self.stemmer.stem(token) for token in tokens if token not in self.stop_words]
+        tokens = [token for token in tokens if token not in self.stop_words]
+        if SNOWBALLSTEMMER_AVAILABLE:
+            tokens = self.stemmer.stemWords(tokens)
+        else:
+            tokens = [self.stemmer.stem(token) for token in tokens]
         
         # Reconvertir a texto
         return ' '.join(tokens)
     
+    def preprocess_batch(self, texts):
+        """
+        Preprocesa una lista de textos, reutilizando la caché en disco si está configurada.
+        
+        Args:
+            texts (list): Textos a preprocesar
+            
+        Returns:
+            list: Textos preprocesados, en el mismo orden
+        """
+        if self.preprocess_cache is None:
+            return [self.preprocess_text(text) for text in texts]
+        
+        keys = [
+            hashlib.blake2b(f"{self.language}\0{text}".encode('utf-8'), digest_size=PREPROCESS_DIGEST_SIZE).digest()
+            if text and isinstance(text, str) else None
+            for text in texts
+        ]
+        cached = self.preprocess_cache.get_many([key for key in keys if key is not None])
+        
+        processed_texts = []
+        new_rows = {}
+        for text, key in zip(texts, keys):
+            if key is None:
+                processed_texts.append("")
+                continue
+            processed = cached.get(key)
+            if processed is None:
+                processed = new_rows[key] = self.preprocess_text(text)
+            processed_texts.append(processed)
+        
+        self.preprocess_cache.put_many(list(new_rows.items()))
+        return processed_texts
+    
     def compute_similarity(self, text1, text2):
         """
         Calcula la similitud coseno entre dos textos.
@@ -109,6 +327,130 @@ class SimilarityAnalyzer:
                 return 1.0
             return 0.0
     
+    def pairwise_similarity_matrix(self, texts):
+        """
+        Calcula la similitud coseno entre todos los pares de textos con un único
+        ajuste TF-IDF sobre el corpus completo y un producto de matrices dispersas.
+        Los términos se proyectan con hashing, sin construir un vocabulario.
+        
+        Args:
+            texts (list): Lista de textos
+            
+        Returns:
+            scipy.sparse.csr_matrix: Matriz (N x N) de similitudes entre 0 y 1
+        """
+        n_texts = len(texts)
+        processed_texts = self.preprocess_batch(texts)
+        
+        if not any(processed_texts):
+            return sparse.csr_matrix((n_texts, n_texts))
+        
+        # HashingVectorizer no tiene estado: solo se ajusta el IDF sobre los conteos
+        # (en float32, que basta para comparar contra un umbral y reduce a la mitad la memoria)
+        counts = self.hashing_vectorizer.transform(processed_texts)
+        tfidf_matrix = TfidfTransformer(norm='l2').fit_transform(counts)
+        
+        if TORCH_CUDA_AVAILABLE and n_texts >= ANN_MIN_TEXTS:
+            return self._gpu_similarity_matrix(tfidf_matrix)
+        if HNSWLIB_AVAILABLE and n_texts >= ANN_MIN_TEXTS:
+            return self._neighbor_similarity_matrix(tfidf_matrix)
+        if DATASKETCH_AVAILABLE and n_texts >= LSH_MIN_TEXTS:
+            return self._candidate_similarity_matrix(processed_texts, tfidf_matrix)
+        
+        # Las filas TF-IDF ya están normalizadas (L2): el producto escalar es la similitud coseno
+        return (tfidf_matrix @ tfidf_matrix.T).tocsr()
+    
+    def _candidate_similarity_matrix(self, processed_texts, tfidf_matrix):
+        """
+        Calcula la similitud coseno solo para los pares candidatos: los que MinHash-LSH
+        considera parecidos a nivel de caracteres y cuyas longitudes no difieren demasiado.
+        
+        Args:
+            processed_texts (list): Textos preprocesados
+            tfidf_matrix (scipy.sparse.csr_matrix): Filas TF-IDF normalizadas (L2) de los textos
+            
+        Returns:
+            scipy.sparse.csr_matrix: Matriz (N x N) simétrica con la similitud de los pares candidatos
+        """
+        lsh = MinHashLSH(threshold=LSH_JACCARD_THRESHOLD, num_perm=MINHASH_NUM_PERM)
+        minhashes = {}
+        for idx, text in enumerate(processed_texts):
+            if not text:
+                continue
+            shingles = {text[k:k + CHAR_SHINGLE_SIZE] for k in range(max(len(text) - CHAR_SHINGLE_SIZE + 1, 1))}
+            minhash = MinHash(num_perm=MINHASH_NUM_PERM)
+            minhash.update_batch([shingle.encode('utf-8') for shingle in shingles])
+            lsh.insert(idx, minhash)
+            minhashes[idx] = minhash
+        
+        lengths = [len(text) for text in processed_texts]
+        candidates = set()
+        for idx, minhash in minhashes.items():
+            for other in lsh.query(minhash):
+                if other == idx:
+                    continue
+                shorter, longer = sorted((lengths[idx], lengths[other]))
+                if shorter >= MIN_LENGTH_RATIO * longer:
+                    candidates.add((min(idx, other), max(idx, other)))
+        
+        return _pair_similarity_matrix(tfidf_matrix, candidates)
+    
+    def _neighbor_similarity_matrix(self, tfidf_matrix):
+        """
+        Calcula la similitud coseno de cada texto con sus ANN_NEIGHBORS vecinos más
+        cercanos, obtenidos de un índice HNSW sobre la proyección SVD de las filas TF-IDF.
+        
+        Args:
+            tfidf_matrix (scipy.sparse.csr_matrix): Filas TF-IDF normalizadas (L2) de los textos
+            
+        Returns:
+            scipy.sparse.csr_matrix: Matriz (N x N) simétrica con la similitud de los pares vecinos
+        """
+        n_texts = tfidf_matrix.shape[0]
+        vectors = _svd_projection(tfidf_matrix)
+        
+        index = hnswlib.Index(space='cosine', dim=ANN_DIMENSIONS)
+        index.init_index(max_elements=n_texts, ef_construction=ANN_EF_CONSTRUCTION, M=ANN_M)
+        index.add_items(vectors)
+        n_neighbors = min(ANN_NEIGHBORS + 1, n_texts)
+        index.set_ef(max(ANN_EF_CONSTRUCTION, n_neighbors))
+        labels, _ = index.knn_query(vectors, k=n_neighbors)
+        
+        # La proyección solo propone vecinos; la similitud se calcula sobre las filas TF-IDF exactas
+        candidates = {
+            (min(idx, other), max(idx, other))
+            for idx, neighbors in enumerate(labels.tolist())
+            for other in neighbors
+            if other != idx
+        }
+        return _pair_similarity_matrix(tfidf_matrix, candidates)
+    
+    def _gpu_similarity_matrix(self, tfidf_matrix):
+        """
+        Calcula la similitud coseno de los pares cuya similitud en la proyección SVD,
+        obtenida por bloques en la GPU, no queda muy por debajo del umbral.
+        
+        Args:
+            tfidf_matrix (scipy.sparse.csr_matrix): Filas TF-IDF normalizadas (L2) de los textos
+            
+        Returns:
+            scipy.sparse.csr_matrix: Matriz (N x N) simétrica con la similitud de los pares candidatos
+        """
+        n_texts = tfidf_matrix.shape[0]
+        vectors = torch.from_numpy(_svd_projection(tfidf_matrix)).cuda().half()
+        candidate_floor = self.similarity_threshold - GPU_CANDIDATE_MARGIN
+        
+        candidates = set()
+        for start in range(0, n_texts, GPU_BLOCK_ROWS):
+            block = vectors[start:start + GPU_BLOCK_ROWS] @ vectors.T
+            pairs = (block >= candidate_floor).nonzero(as_tuple=False).cpu().numpy()
+            rows = pairs[:, 0] + start
+            cols = pairs[:, 1]
+            upper = rows < cols
+            candidates.update(zip(rows[upper].tolist(), cols[upper].tolist()))
+        
+        return _pair_similarity_matrix(tfidf_matrix, candidates)
+    
     def is_similar(self, text1, text2, threshold=None):
         """
         Determina si dos textos son similares según el umbral configurado.
@@ -10,6 +10,7 @@ import os
 import json
 import re
 from datetime import datetime
+from functools import lru_cache
 import unicodedata
 
 logger = logging.getLogger(__name__)
@@ -34,6 +35,22 @@ HEADER_PATTERNS = [
     r'^[A-ZÁÉÍÓÚÑ\s\-–\/]{5,}$',  # Mayúsculas con acentos
 ]
 
+# Flags de extracción de bloques: los predeterminados de PyMuPDF sin los bloques de imagen
+_BLOCK_TEXT_FLAGS = fitz.TEXTFLAGS_BLOCKS & ~fitz.TEXT_PRESERVE_IMAGES
+# Tipo de bloque de texto en la tupla de get_text("blocks") (1 es imagen)
+_TEXT_BLOCK_TYPE = 0
+
+# Expresiones regulares compiladas una sola vez para todo el módulo
+_HEADER_RES = [re.compile(pattern) for pattern in HEADER_PATTERNS]
+_URL_RE = re.compile(
+    r'http[s]?://(?:[a-zA-Z]|[0-9]|[$-_@.&+]|[!*\\(\\),]|(?:%[0-9a-fA-F][0-9a-fA-F]))+'
+)
+_EMAIL_RE = re.compile(r'[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}')
+# Caracteres de control y espacios consecutivos, que se reducen a un único espacio
+_CTRL_WS_RE = re.compile(r'[\x00-\x1F\x7F\s]+')
+_WS_RE = re.compile(r'\s+')
+
+@lru_cache(maxsize=4096)
 def normalize_text(text):
     """
     Normaliza el texto eliminando caracteres especiales y normalizando espacios.
@@ -41,61 +58,73 @@ def normalize_text(text):
     if not text:
         return ""
     
-    # Normalizar Unicode (NFD y luego eliminar los diacríticos)
-    text = unicodedata.normalize('NFD', text)
-    text = ''.join([c for c in text if not unicodedata.combining(c)])
+    # Normalizar Unicode (NFD y luego eliminar los diacríticos); un texto ASCII no tiene diacríticos
+    if not text.isascii():
+        text = unicodedata.normalize('NFD', text)
+        text = ''.join([c for c in text if not unicodedata.combining(c)])
     
     # Reemplazar múltiples espacios por uno solo
-    text = re.sub(r'\s+', ' ', text)
+    text = _WS_RE.sub(' ', text)
     
     # Eliminar espacios al inicio y final
     return text.strip()
 
-def is_likely_header(text):
+# Cabeceras conocidas indexadas por su forma normalizada en mayúsculas
+# (si dos variantes normalizan igual, se conserva la primera de la lista)
+_NORMALIZED_KNOWN_HEADERS = {}
+for _header in KNOWN_HEADERS:
+    _NORMALIZED_KNOWN_HEADERS.setdefault(normalize_text(_header).upper(), _header)
+
+def _match_header(text):
     """
-    Determina si un texto es probablemente una cabecera basándose en patrones.
+    Determina si un texto es probablemente una cabecera y, si coincide con una
+    cabecera conocida, cuál es.
+    
+    Returns:
+        tuple: (es_cabecera, cabecera_conocida o None)
     """
     text = text.strip()
     if not text:
-        return False
+        return False, None
     
     # Verificar si coincide con una cabecera conocida
-    normalized_text = normalize_text(text).upper()
-    for header in KNOWN_HEADERS:
-        if normalized_text == normalize_text(header).upper():
-            return True
+    known_header = _NORMALIZED_KNOWN_HEADERS.get(normalize_text(text).upper())
+    if known_header is not None:
+        return True, known_header
     
     # Verificar patrones de cabecera
-    for pattern in HEADER_PATTERNS:
-        if re.match(pattern, text):
+    for pattern in _HEADER_RES:
+        if pattern.match(text):
             # Descartar líneas demasiado largas
             if len(text) > 50:
-                return False
+                return False, None
             # Descartar líneas con caracteres típicos de URLs o correos
             if any(char in text for char in '@:?=&%'):
-                return False
+                return False, None
             # Al menos 5 caracteres de longitud
             if len(text) < 5:
-                return False
-            return True
+                return False, None
+            return True, None
     
-    return False
+    return False, None
+
+def is_likely_header(text):
+    """
+    Determina si un texto es probablemente una cabecera basándose en patrones.
+    """
+    return _match_header(text)[0]
 
 def find_urls_in_text(text):
     """
     Busca URLs en un texto y las devuelve como una lista.
     """
-    url_pattern = re.compile(
-        r'http[s]?://(?:[a-zA-Z]|[0-9]|[$-_@.&+]|[!*\\(\\),]|(?:%[0-9a-fA-F][0-9a-fA-F]))+'
-    )
-    return url_pattern.findall(text)
+    return _URL_RE.findall(text)
 
 def contains_email(text):
     """
     Verifica si el texto contiene un correo electrónico.
     """
-    email_pattern = re.compile(r'[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}')
-    return bool(email_pattern.search(text))
+    return bool(_EMAIL_RE.search(text))
 
 def clean_paragraph(text):
     """
@@ -104,12 +133,41 @@ def clean_paragraph(text):
     if not text:
         return ""
     
-    # Eliminar caracteres de control y normalizar espacios
-    text = re.sub(r'[\x00-\x1F\x7F]', ' ', text)
-    text = re.sub(r'\s+', ' ', text)
+    # Eliminar caracteres de control y normalizar espacios en una sola pasada
+    text = _CTRL_WS_RE.sub(' ', text)
     
     return text.strip()
 
+def split_urls(text):
+    """
+    Separa las URLs de un texto en una sola pasada de la expresión regular.
+    
+    Returns:
+        tuple: (lista de URLs encontradas, texto sin las URLs)
+    """
+    urls = []
+    pieces = []
+    last = 0
+    for match in _URL_RE.finditer(text):
+        urls.append(match.group())
+        pieces.append(text[last:match.start()])
+        last = match.end()
+    if not urls:
+        return urls, text
+    pieces.append(text[last:])
+    return urls, ''.join(pieces)
+
+def _brief_description(text_without_urls, max_words=5):
+    """
+    Genera la descripción breve a partir de un texto del que ya se eliminaron las URLs.
+    """
+    # Basta con separar max_words + 1 palabras para saber si hay que recortar
+    words = text_without_urls.split(None, max_words)
+    if len(words) <= max_words:
+        return text_without_urls.strip()
+    
+    return " ".join(words[:max_words]) + "..."
+
 def generate_brief_description(text, max_words=5):
     """
     Genera una breve descripción del texto usando las primeras palabras,
@@ -119,16 +177,75 @@ def generate_brief_description(text, max_words=5):
         return ""
     
     # Eliminar URLs del texto para la descripción
-    url_pattern = re.compile(
-        r'http[s]?://(?:[a-zA-Z]|[0-9]|[$-_@.&+]|[!*\\(\\),]|(?:%[0-9a-fA-F][0-9a-fA-F]))+'
-    )
-    text_without_urls = url_pattern.sub('', text)
+    _, text_without_urls = split_urls(text)
+    return _brief_description(text_without_urls, max_words)
+
+def iter_paragraphs(pdf_path):
+    """
+    Recorre el PDF página a página y genera tuplas (sección, párrafo) en orden de lectura.
+    Al detectar una cabecera se genera (sección, None) para registrar la sección.
+    Tras cada página se vacía la caché interna de PyMuPDF para acotar la memoria.
     
-    words = text_without_urls.split()
-    if len(words) <= max_words:
-        return text_without_urls.strip()
+    Args:
+        pdf_path (str): Ruta al archivo PDF
+        
+    Yields:
+        tuple: (nombre de la sección, diccionario del párrafo o None)
+    """
+    current_section = "CONTENIDO_INICIAL"  # Sección por defecto
     
-    return " ".join(words[:max_words]) + "..."
+    with fitz.open(pdf_path) as doc:
+        logger.info(f"Abriendo PDF para extracción de texto: {pdf_path} ({doc.page_count} páginas)")
+        
+        for page_num, page in enumerate(doc):
+            # Extraer bloques de texto (párrafos), sin decodificar imágenes ni reordenar bloques
+            blocks = page.get_text("blocks", flags=_BLOCK_TEXT_FLAGS, sort=False)
+            
+            for block in blocks:
+                # En PyMuPDF los bloques son tuplas (x0, y0, x1, y1, text, block_no, block_type)
+                if block[6] != _TEXT_BLOCK_TYPE:
+                    continue
+                text = block[4].strip()
+                if not text:
+                    continue
+                
+                # Verificar si es una cabecera
+                is_header, known_header = _match_header(text)
+                if is_header:
+                    # Usar la cabecera conocida que coincida o, si no hay, el propio texto
+                    current_section = known_header or text
+                    logger.debug(f"Cabecera detectada: '{current_section}' en página {page_num + 1}")
+                    yield current_section, None
+                    continue
+                
+                # Es un párrafo normal
+                # Descartar primero los párrafos con correos electrónicos, antes de limpiarlos
+                # (la limpieza solo toca espacios y caracteres de control, que no forman parte de un correo)
+                if contains_email(text):
+                    logger.debug(f"Párrafo descartado por contener correo electrónico: {text[:50]}...")
+                    continue
+                
+                # Limpiar el texto
+                clean_text = clean_paragraph(text)
+                if not clean_text:
+                    continue
+                
+                # Buscar URLs en el texto (la descripción usa el mismo texto sin URLs)
+                urls, text_without_urls = split_urls(clean_text)
+                
+                # Crear el objeto de párrafo
+                yield current_section, {
+                    "metadata": {
+                        "description": _brief_description(text_without_urls),
+                        "url": urls[0] if urls else ""
+                    },
+                    "text": clean_text,
+                    "page": page_num + 1
+                }
+            
+            # Liberar la página y los recursos que PyMuPDF mantiene en caché
+            blocks = page = None
+            fitz.TOOLS.store_shrink(100)
 
 def extract_text_by_sections(pdf_path):
     """
@@ -147,73 +264,14 @@ def extract_text_by_sections(pdf_path):
         return {}
     
     # Estructura para almacenar el texto extraído
-    sections = {}
-    current_section = "CONTENIDO_INICIAL"  # Sección por defecto
-    sections[current_section] = []
+    sections = {"CONTENIDO_INICIAL": []}
     
     try:
-        doc = fitz.open(pdf_path)
-        logger.info(f"Abriendo PDF para extracción de texto: {pdf_path} ({doc.page_count} páginas)")
-        
-        for page_num in range(doc.page_count):
-            page = doc.load_page(page_num)
-            
-            # Extraer bloques de texto (párrafos)
-            blocks = page.get_text("blocks")
-            
-            for block in blocks:
-                # En PyMuPDF los bloques son tuplas (x0, y0, x1, y1, text, block_no, block_type)
-                text = block[4].strip()
-                if not text:
-                    continue
-                
-                # Verificar si es una cabecera
-                if is_likely_header(text):
-                    normalized_header = normalize_text(text).upper()
-                    # Verificar si coincide con una cabecera conocida
-                    for known_header in KNOWN_HEADERS:
-                        if normalized_header == normalize_text(known_header).upper():
-                            current_section = known_header
-                            break
-                    else:
-                        # Si no coincide exactamente, usar el texto como sección
-                        current_section = text
-                    
-                    # Inicializar la sección si no existe
-                    if current_section not in sections:
-                        sections[current_section] = []
-                    
-                    logger.debug(f"Cabecera detectada: '{current_section}' en página {page_num + 1}")
-                else:
-                    # Es un párrafo normal
-                    # Limpiar el texto
-                    clean_text = clean_paragraph(text)
-                    if not clean_text:
-                        continue
-                    
-                    # Verificar si el párrafo contiene correos electrónicos
-                    if contains_email(clean_text):
-                        logger.debug(f"Párrafo descartado por contener correo electrónico: {clean_text[:50]}...")
-                        continue
-                    
-                    # Buscar URLs en el texto
-                    urls = find_urls_in_text(clean_text)
-                    
-                    # Crear el objeto de párrafo
-                    paragraph = {
-                        "metadata": {
-                            "description": generate_brief_description(clean_text),
-                            "url": urls[0] if urls else ""
-                        },
-                        "text": clean_text,
-                        "page": page_num + 1
-                    }
-                    
-                    # Añadir a la sección actual
-                    sections[current_section].append(paragraph)
-        
-        # Cerrar el documento
-        doc.close()
+        for section, paragraph in iter_paragraphs(pdf_path):
+            # Inicializar la sección si no existe y añadir el párrafo
+            section_paragraphs = sections.setdefault(section, [])
+            if paragraph is not None:
+                section_paragraphs.append(paragraph)
         
         # Eliminar secciones vacías
         sections = {k: v for k, v in sections.items() if v}
@@ -5,14 +5,64 @@ automática y mecanismos adaptativos de detección de duplicados.
 """
 
 import os
+import re
+import hashlib
 import logging
 import json
 from urllib.parse import urlparse
 from difflib import SequenceMatcher
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
 logger = logging.getLogger(__name__)
 
+# scikit-learn es opcional: con él los candidatos a duplicado de cada categoría se obtienen
+# de una vez por coseno entre vectores de n-gramas de caracteres (producto de matrices dispersas)
+try:
+    from sklearn.feature_extraction.text import HashingVectorizer
+    SKLEARN_AVAILABLE = True
+except ImportError:
+    SKLEARN_AVAILABLE = False
+
+# rapidfuzz es opcional: su similitud Indel (en C++, y con process.cdist para todos los pares
+# de una categoría en paralelo) nunca es menor que el ratio de difflib, así que descarta pares
+# sin compararlos; la similitud que decide sigue siendo siempre la de difflib
+try:
+    from rapidfuzz import fuzz, process as rapidfuzz_process
+    RAPIDFUZZ_AVAILABLE = True
+except ImportError:
+    RAPIDFUZZ_AVAILABLE = False
+
+# pyahocorasick es opcional: un autómata con los patrones de todas las categorías
+# encuentra en una sola pasada todos los que aparecen en la URL
+try:
+    import ahocorasick
+    AHOCORASICK_AVAILABLE = True
+except ImportError:
+    AHOCORASICK_AVAILABLE = False
+
+# Caracteres máximos de cada contenido que se comparan
+MAX_COMPARE_CHARS = 5000
+
+# Tamaño (bytes) de la huella BLAKE2b con que se detectan contenidos idénticos
+CONTENT_DIGEST_SIZE = 16
+
+# Candidatos por coseno de n-gramas de caracteres: dimensión del hashing, mínimo de
+# elementos de una categoría para usarlos y umbral de coseno. El coseno no es comparable
+# con los umbrales de DEFAULT_THRESHOLDS (calibrados para la similitud de edición, que sí
+# depende del orden), así que solo descarta pares claramente distintos: cada candidato se
+# confirma con calculate_similarity
+CHAR_NGRAM_RANGE = (4, 5)
+HASHING_N_FEATURES = 2 ** 18
+VECTORIZE_MIN_ITEMS = 32
+COSINE_CANDIDATE_THRESHOLD = 0.4
+
+# Margen con que se compara la cota Indel de rapidfuzz con el umbral (errores de redondeo)
+EDIT_BOUND_TOLERANCE = 1e-9
+
+# Hilos por defecto para extraer el contenido de las URLs (trabajo de red)
+DEFAULT_FETCH_WORKERS = 16
+
 class URLClassifier:
     """
     Clase para clasificar URLs por tipo de contenido y detectar duplicados
@@ -57,6 +107,7 @@ class URLClassifier:
                    - thresholds: Diccionario de umbrales de similitud por categoría
                    - cache_dir: Directorio para almacenar caché de clasificación
                    - debug: Modo debug para registrar información detallada
+                   - fetch_workers: Hilos para extraer contenido de URLs en paralelo
         """
         self.config = config or {}
         self.thresholds = {**self.DEFAULT_THRESHOLDS}
@@ -65,6 +116,27 @@ class URLClassifier:
         if 'thresholds' in self.config:
             self.thresholds.update(self.config['thresholds'])
         
+        # Una expresión compilada por categoría (alternativa de sus patrones), en orden de prioridad
+        self._category_patterns = [
+            (category, re.compile('|'.join(re.escape(pattern) for pattern in patterns), re.IGNORECASE))
+            for category, patterns in self.CATEGORIES.items()
+            if patterns
+        ]
+        
+        # Con pyahocorasick, un único autómata; cada patrón guarda la prioridad de su categoría
+        self._category_automaton = None
+        if AHOCORASICK_AVAILABLE:
+            self._category_automaton = ahocorasick.Automaton()
+            for priority, (category, patterns) in enumerate(self.CATEGORIES.items()):
+                for pattern in patterns:
+                    pattern = pattern.lower()
+                    if pattern not in self._category_automaton:
+                        self._category_automaton.add_word(pattern, (priority, category, pattern))
+            if len(self._category_automaton):
+                self._category_automaton.make_automaton()
+            else:
+                self._category_automaton = None
+        
         self.cache_dir = self.config.get('cache_dir', 'cache')
         self.debug = self.config.get('debug', False)
         
@@ -87,18 +159,28 @@ class URLClassifier:
         if not url:
             return "invalid"
             
-        url_lower = url.lower()
-        
-        # Primero verificar extensiones de archivo
-        for category, patterns in self.CATEGORIES.items():
-            if category == "other":
-                continue
-                
-            for pattern in patterns:
-                if pattern in url_lower:
-                    if self.debug:
-                        logger.debug(f"URL {url} clasificada como {category} (patrón: {pattern})")
-                    return category
+        # Con el autómata, de todos los patrones presentes gana el de la categoría más prioritaria
+        if self._category_automaton is not None:
+            best = None
+            for _, match in self._category_automaton.iter(url.lower()):
+                if best is None or match[0] < best[0]:
+                    best = match
+                    if best[0] == 0:
+                        break
+            if best is not None:
+                _, category, pattern = best
+                if self.debug:
+                    logger.debug(f"URL {url} clasificada como {category} (patrón: {pattern})")
+                return category
+            return "other"
+        
+        # Primera categoría (en orden de prioridad) con algún patrón presente en la URL
+        for category, category_pattern in self._category_patterns:
+            match = category_pattern.search(url)
+            if match:
+                if self.debug:
+                    logger.debug(f"URL {url} clasificada como {category} (patrón: {match.group().lower()})")
+                return category
         
         # Si no coincide con ningún patrón, usar "other"
         return "other"
@@ -129,12 +211,28 @@ class URLClassifier:
         
         return result
     
-    def calculate_similarity(self, text1, text2):
+    def _normalize_content(self, content):
+        """
+        Normaliza un contenido para compararlo: minúsculas, espacios colapsados y
+        como máximo MAX_COMPARE_CHARS caracteres.
+        
+        Args:
+            content: Contenido a normalizar
+            
+        Returns:
+            str: Contenido normalizado (cadena vacía si no hay contenido)
+        """
+        if not content:
+            return ''
+        return ' '.join(content.lower().split())[:MAX_COMPARE_CHARS]
+    
+    def calculate_similarity(self, text1, text2, normalize=True):
         """
         Calcula la similitud entre dos textos.
         
         Args:
             text1, text2: Textos a comparar
+            normalize: Si es False, los textos ya vienen normalizados con _normalize_content
             
         Returns:
             float: Ratio de similitud entre 0.0 y 1.0
@@ -142,16 +240,12 @@ class URLClassifier:
         if not text1 or not text2:
             return 0.0
             
-        # Normalizar textos
-        text1 = ' '.join(text1.lower().split())
-        text2 = ' '.join(text2.lower().split())
-        
-        # Para textos muy largos, utilizamos solo los primeros 5000 caracteres
-        if len(text1) > 5000 or len(text2) > 5000:
-            text1 = text1[:5000]
-            text2 = text2[:5000]
+        # Normalizar textos (en minúsculas y recortados a MAX_COMPARE_CHARS caracteres)
+        if normalize:
+            text1 = self._normalize_content(text1)
+            text2 = self._normalize_content(text2)
         
-        # Calcular similitud
+        # Calcular similitud (siempre con difflib: los umbrales están calibrados para su ratio)
         matcher = SequenceMatcher(None, text1, text2)
         similarity = matcher.ratio()
         
@@ -160,13 +254,96 @@ class URLClassifier:
             
         return similarity
     
-    def is_duplicate(self, content1, content2, category=None):
+    def _candidate_matrix(self, normalized):
+        """
+        Obtiene los pares candidatos a duplicado: los de coseno entre n-gramas de
+        caracteres de su texto normalizado mayor o igual a COSINE_CANDIDATE_THRESHOLD.
+        
+        Args:
+            normalized: Lista de contenidos ya normalizados con _normalize_content
+            
+        Returns:
+            scipy.sparse.csr_matrix: Matriz dispersa (n x n) con solo los pares candidatos
+        """
+        # Filas normalizadas L2: el producto X·Xᵀ es directamente la matriz de cosenos
+        vectorizer = HashingVectorizer(
+            analyzer='char_wb',
+            ngram_range=CHAR_NGRAM_RANGE,
+            n_features=HASHING_N_FEATURES,
+            alternate_sign=False,
+            norm='l2',
+            dtype='float32'
+        )
+        matrix = vectorizer.transform(normalized)
+        candidates = (matrix @ matrix.T).tocsr()
+        candidates.data[candidates.data < COSINE_CANDIDATE_THRESHOLD] = 0
+        candidates.eliminate_zeros()
+        return candidates
+    
+    def _below_threshold(self, text1, text2, threshold):
+        """
+        Indica si un par queda seguro por debajo del umbral según la cota Indel de rapidfuzz,
+        que nunca es menor que la similitud de calculate_similarity.
+        
+        Args:
+            text1, text2: Textos ya normalizados con _normalize_content
+            threshold: Umbral de similitud de la categoría
+            
+        Returns:
+            bool: True si el par puede descartarse sin calcular calculate_similarity
+        """
+        if not RAPIDFUZZ_AVAILABLE:
+            return False
+        return fuzz.ratio(text1, text2) / 100.0 < threshold - EDIT_BOUND_TOLERANCE
+    
+    def _edit_similarity_matrix(self, normalized):
+        """
+        Calcula con rapidfuzz la similitud Indel entre todos los pares de contenidos: una
+        cota superior de la de calculate_similarity, con la que se eligen los candidatos.
+        
+        Args:
+            normalized: Lista de contenidos ya normalizados con _normalize_content
+            
+        Returns:
+            numpy.ndarray: Matriz densa (n x n) de cotas entre 0.0 y 1.0
+        """
+        matrix = rapidfuzz_process.cdist(normalized, normalized, scorer=fuzz.ratio, workers=-1) / 100.0
+        
+        # Un contenido vacío no se parece a nada (rapidfuzz da 1.0 entre dos vacíos)
+        empty_positions = [position for position, text in enumerate(normalized) if not text]
+        if empty_positions:
+            matrix[empty_positions, :] = 0.0
+            matrix[:, empty_positions] = 0.0
+        return matrix
+    
+    def _category_matrix(self, category, matrix_func, normalized, similarity_cache=None):
+        """
+        Calcula (o reutiliza de similarity_cache) la matriz de una categoría.
+        
+        Args:
+            category: Categoría de los contenidos
+            matrix_func: _candidate_matrix o _edit_similarity_matrix
+            normalized: Lista de contenidos ya normalizados con _normalize_content
+            similarity_cache: Diccionario opcional de similitudes ya calculadas
+            
+        Returns:
+            Matriz devuelta por matrix_func
+        """
+        if similarity_cache is not None and category in similarity_cache:
+            return similarity_cache[category]
+        matrix = matrix_func(normalized)
+        if similarity_cache is not None:
+            similarity_cache[category] = matrix
+        return matrix
+    
+    def is_duplicate(self, content1, content2, category=None, normalize=True):
         """
         Determina si dos contenidos son duplicados según su categoría.
         
         Args:
             content1, content2: Contenidos a comparar
             category: Categoría de los contenidos (opcional)
+            normalize: Si es False, los contenidos ya vienen normalizados con _normalize_content
             
         Returns:
             tuple: (es_duplicado, similitud)
@@ -178,7 +355,7 @@ class URLClassifier:
         )
         
         # Calcular similitud
-        similarity = self.calculate_similarity(content1, content2)
+        similarity = self.calculate_similarity(content1, content2, normalize=normalize)
         
         # Determinar si es duplicado
         is_dup = similarity >= threshold
@@ -191,12 +368,16 @@ class URLClassifier:
             
         return (is_dup, similarity)
     
-    def detect_duplicates(self, content_items):
+    def detect_duplicates(self, content_items, similarity_cache=None):
         """
         Detecta duplicados en una lista de elementos de contenido.
         
         Args:
             content_items: Lista de diccionarios con 'url', 'content' y 'category'
+            similarity_cache: Diccionario opcional donde se guardan las similitudes calculadas
+                              (la matriz de candidatos o de cotas Indel de cada categoría y la
+                              de cada par comparado) para reutilizarlas al repetir el análisis
+                              sobre los mismos elementos
             
         Returns:
             dict: Resultados del análisis de duplicados
@@ -227,33 +408,98 @@ class URLClassifier:
             # Obtener umbral para esta categoría
             threshold = self.thresholds.get(category, self.thresholds.get("default"))
             
+            # Contenido normalizado de cada elemento, calculado una sola vez para todas sus comparaciones
+            normalized_contents = [self._normalize_content(item.get('content', '')) for item in items]
+            
+            # Con suficientes elementos y scikit-learn, el coseno de n-gramas propone los candidatos;
+            # si no, con rapidfuzz se calculan de una vez las cotas Indel de todos los pares. En
+            # ambos casos cada candidato se confirma con calculate_similarity
+            candidate_matrix = None
+            edit_bounds = None
+            if SKLEARN_AVAILABLE and len(items) >= VECTORIZE_MIN_ITEMS:
+                candidate_matrix = self._category_matrix(
+                    category, self._candidate_matrix, normalized_contents, similarity_cache
+                )
+            elif RAPIDFUZZ_AVAILABLE:
+                edit_bounds = self._category_matrix(
+                    category, self._edit_similarity_matrix, normalized_contents, similarity_cache
+                )
+            
+            # Posición (en items) de cada único, para indexar las matrices y los contenidos
+            # normalizados, y a la inversa, índice en unique_items de cada posición única
+            unique_positions = []
+            unique_index_by_position = {}
+            
+            # Huella del contenido normalizado de cada único: los idénticos se resuelven sin comparar
+            # (su similitud es 1.0, que supera cualquier umbral válido)
+            unique_digests = {}
+            
             # Buscar duplicados
-            for item in items:
-                is_duplicate = False
-                content = item.get('content', '')
+            for position, item in enumerate(items):
+                normalized = normalized_contents[position]
+                match = None
+                
+                digest = None
+                if normalized and threshold <= 1.0:
+                    digest = hashlib.blake2b(normalized.encode('utf-8'), digest_size=CONTENT_DIGEST_SIZE).digest()
+                    identical_item = unique_digests.get(digest)
+                    if identical_item is not None:
+                        match = (identical_item, 1.0)
                 
-                # Comparar con elementos previos únicos
-                for unique_item in unique_items:
-                    unique_content = unique_item.get('content', '')
-                    is_dup, similarity = self.is_duplicate(
-                        content, unique_content, category
-                    )
+                if match is None:
+                    # Candidatos: todos los únicos previos, los propuestos por el coseno de n-gramas
+                    # o los que alcanzan el umbral por su cota Indel (en el orden en que se
+                    # registraron como únicos)
+                    candidates = range(len(unique_items))
+                    if candidate_matrix is not None:
+                        candidates = sorted(
+                            unique_index_by_position[other] for other in candidate_matrix[position].indices.tolist()
+                            if other in unique_index_by_position
+                        )
+                    elif edit_bounds is not None:
+                        candidates = []
+                        if unique_positions:
+                            row = edit_bounds[position][unique_positions]
+                            candidates = (row >= threshold - EDIT_BOUND_TOLERANCE).nonzero()[0].tolist()
                     
-                    if is_dup:
-                        is_duplicate = True
-                        duplicate_info = {
-                            "original_url": unique_item['url'],
-                            "duplicate_url": item['url'],
-                            "similarity": similarity,
-                            "category": category,
-                            "threshold_used": threshold
-                        }
-                        duplicates.append(duplicate_info)
-                        break
+                    # Comparar con elementos previos únicos
+                    for unique_index in candidates:
+                        unique_position = unique_positions[unique_index]
+                        pair_key = (category, unique_position, position)
+                        similarity = similarity_cache.get(pair_key) if similarity_cache is not None else None
+                        if similarity is None:
+                            # Sin matriz de cotas, la cota Indel del par descarta los claramente distintos
+                            if edit_bounds is None and self._below_threshold(
+                                normalized, normalized_contents[unique_position], threshold
+                            ):
+                                continue
+                            similarity = self.calculate_similarity(
+                                normalized, normalized_contents[unique_position], normalize=False
+                            )
+                            if similarity_cache is not None:
+                                similarity_cache[pair_key] = similarity
+                        
+                        if similarity >= threshold:
+                            match = (unique_items[unique_index], similarity)
+                            break
+                
+                if match is not None:
+                    original_item, similarity = match
+                    duplicates.append({
+                        "original_url": original_item['url'],
+                        "duplicate_url": item['url'],
+                        "similarity": similarity,
+                        "category": category,
+                        "threshold_used": threshold
+                    })
+                    continue
                 
-                # Si no es duplicado, agregar a únicos
-                if not is_duplicate:
-                    unique_items.append(item)
+                # No es duplicado: agregar a únicos
+                if digest is not None:
+                    unique_digests[digest] = item
+                unique_index_by_position[position] = len(unique_items)
+                unique_positions.append(position)
+                unique_items.append(item)
             
             # Agregar resultados de esta categoría
             all_unique.extend(unique_items)
@@ -301,8 +547,9 @@ class URLClassifier:
                 'category': category
             })
         
-        # Detectar duplicados
-        result = self.detect_duplicates(content_items)
+        # Detectar duplicados (guardando las similitudes por si hace falta el fallback)
+        similarity_cache = {}
+        result = self.detect_duplicates(content_items, similarity_cache)
         
         # Extraer URLs únicas
         unique_urls = [item['url'] for item in result['unique_items']]
@@ -320,17 +567,8 @@ class URLClassifier:
                 f"Aplicando mecanismo de fallback."
             )
             
-            # Usar un umbral más estricto como fallback
-            fallback_items = []
-            for url, content in urls_with_content.items():
-                category = self.classify_url(url)
-                # Aumentar umbral en un 10%
-                fallback_items.append({
-                    'url': url,
-                    'content': content,
-                    'category': category,
-                    '_fallback': True
-                })
+            # Usar un umbral más estricto como fallback (mismos elementos, ya clasificados)
+            fallback_items = [{**item, '_fallback': True} for item in content_items]
             
             # Guardar umbrales originales
             original_thresholds = self.thresholds.copy()
@@ -341,8 +579,9 @@ class URLClassifier:
                     self.thresholds[category] + 0.1, 0.99
                 )
             
-            # Detectar duplicados con umbrales más estrictos
-            fallback_result = self.detect_duplicates(fallback_items)
+            # Detectar duplicados con umbrales más estrictos, reutilizando las similitudes
+            # ya calculadas: solo se comparan los pares que la primera pasada no llegó a comparar
+            fallback_result = self.detect_duplicates(fallback_items, similarity_cache)
             
             # Restaurar umbrales originales
             self.thresholds = original_thresholds
@@ -390,19 +629,27 @@ class URLClassifier:
         urls_with_content = {}
         failed_urls = []
         
+        def safe_fetch(url):
+            try:
+                content = content_extractor_func(url)
+            except Exception as e:
+                logger.error(f"Error extrayendo contenido de {url}: {e}")
+                return None
+            if not content:
+                logger.warning(f"Contenido vacío para URL: {url}")
+            return content
+        
         for category, category_urls in classified.items():
             logger.info(f"Procesando {len(category_urls)} URLs de categoría {category}")
-            
-            for url in category_urls:
-                try:
-                    content = content_extractor_func(url)
-                    if content:
-                        urls_with_content[url] = content
-                    else:
-                        logger.warning(f"Contenido vacío para URL: {url}")
-                        failed_urls.append(url)
-                except Exception as e:
-                    logger.error(f"Error extrayendo contenido de {url}: {e}")
+        
+        # Extracción en paralelo (limitada por la red); map conserva el orden por categoría
+        all_urls = [url for category_urls in classified.values() for url in category_urls]
+        fetch_workers = self.config.get('fetch_workers', DEFAULT_FETCH_WORKERS)
+        with ThreadPoolExecutor(max_workers=fetch_workers) as executor:
+            for url, content in zip(all_urls, executor.map(safe_fetch, all_urls)):
+                if content:
+                    urls_with_content[url] = content
+                else:
                     failed_urls.append(url)
         
         # Filtrar duplicados
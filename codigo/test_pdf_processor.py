@@ -0,0 +1,34 @@
+"""
+Pruebas de la extracción de enlaces de lib/pdf_processor.py: el contexto de un
+enlace debe limitarse al texto cercano aunque se reutilice el TextPage de la página.
+
+Uso:
+    python -m pytest codigo/test_pdf_processor.py
+"""
+
+import os
+import sys
+
+import pytest
+
+fitz = pytest.importorskip("fitz")
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from lib.pdf_processor import _extract_page_links
+
+
+def test_link_context_is_limited_to_text_near_the_link():
+    doc = fitz.open()
+    page = doc.new_page()
+    page.insert_text((72, 72), "Top paragraph far away from link")
+    page.insert_text((72, 400), "Near the link: click here")
+    page.insert_text((72, 750), "Bottom footer text")
+    link_rect = fitz.Rect(72, 388, 250, 404)
+    page.insert_link({"kind": fitz.LINK_URI, "from": link_rect, "uri": "https://www.sunass.gob.pe"})
+
+    # Releer la página para obtener los enlaces tal como los devuelve un PDF guardado
+    doc = fitz.open("pdf", doc.tobytes())
+    links = _extract_page_links(doc.load_page(0), 0)
+
+    assert [link["URL"] for link in links] == ["https://www.sunass.gob.pe"]
+    assert links[0]["Context"] == "Near the link: click here"
@@ -0,0 +1,67 @@
+"""
+Pruebas de la detección de redundancias de SemanticCleaner (lib/semantic_cleaner/cleaner.py):
+los candidatos de MinHash-LSH deben producir los mismos grupos que la matriz
+dispersa exacta de similitud TF-IDF.
+
+Uso:
+    python -m pytest codigo/test_semantic_cleaner_lsh.py
+"""
+
+import os
+import random
+import sys
+
+import pytest
+
+pytest.importorskip("numpy")
+pytest.importorskip("scipy")
+pytest.importorskip("sklearn")
+pytest.importorskip("nltk")
+pytest.importorskip("joblib")
+pytest.importorskip("datasketch")
+
+import numpy as np
+from scipy import sparse
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from lib.semantic_cleaner.cleaner import SemanticCleaner, _connected_groups
+
+
+def _build_corpus():
+    """Textos base con variantes de pocas palabras cambiadas, más textos sin relación."""
+    rng = random.Random(7)
+    vocabulary = [f"termino{idx}" for idx in range(600)]
+    texts = []
+    for _ in range(4):
+        words = [rng.choice(vocabulary) for _ in range(60)]
+        texts.append(" ".join(words))
+        # Variantes con 2 y 3 de sus 60 palabras reemplazadas (hasta un 5%)
+        for changed in (2, 3):
+            variant = list(words)
+            for position in rng.sample(range(len(variant)), changed):
+                variant[position] = rng.choice(vocabulary)
+            texts.append(" ".join(variant))
+    for _ in range(4):
+        texts.append(" ".join(rng.choice(vocabulary) for _ in range(60)))
+    return texts
+
+
+def _lsh_groups(cleaner, texts):
+    pairs = cleaner._find_similar_pairs_lsh(texts)
+    rows = [i for i, _ in pairs]
+    cols = [j for _, j in pairs]
+    adjacency = sparse.csr_matrix(
+        (np.ones(len(pairs), dtype=np.int8), (rows, cols)), shape=(len(texts), len(texts))
+    )
+    return _connected_groups(adjacency)
+
+
+def test_lsh_groups_match_exact_groups():
+    cleaner = SemanticCleaner(similarity_threshold=0.65)
+    texts = _build_corpus()
+
+    exact_groups = _connected_groups(cleaner.compute_similarity_matrix(texts))
+
+    # El corpus debe tener redundancias reales para que la comparación tenga sentido
+    assert any(len(group) > 1 for group in exact_groups)
+    assert _lsh_groups(cleaner, texts) == exact_groups
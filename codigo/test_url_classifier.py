@@ -0,0 +1,110 @@
+"""
+Pruebas de la detección de duplicados de URLClassifier (lib/url_classifier.py):
+el resultado de un par no debe depender del tamaño de su categoría, es decir, de
+si se usan o no los candidatos por coseno de n-gramas, ni de si está instalado
+rapidfuzz (los umbrales están calibrados para el ratio de difflib).
+
+Uso:
+    python -m pytest codigo/test_url_classifier.py
+"""
+
+import os
+import random
+import sys
+from difflib import SequenceMatcher
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'lib'))
+import url_classifier
+from url_classifier import URLClassifier, VECTORIZE_MIN_ITEMS
+
+SENTENCES = [
+    "La Sunass supervisó el servicio de agua potable en el distrito de Comas.",
+    "Se detectaron fugas en la red de alcantarillado de la zona norte.",
+    "La empresa prestadora deberá presentar un plan de mantenimiento en treinta días.",
+    "Los usuarios pueden presentar reclamos en el módulo de atención al ciudadano.",
+    "El proyecto de ampliación beneficiará a más de diez mil familias.",
+]
+
+
+def _category_items(total):
+    """Un original, su copia con frases reordenadas, una copia casi idéntica y relleno."""
+    original = " ".join(SENTENCES)
+    reordered = " ".join(reversed(SENTENCES))
+    near_copy = original.replace("treinta", "cuarenta")
+    items = [
+        {"url": "https://andina.pe/original", "content": original, "category": "news"},
+        {"url": "https://andina.pe/reordenada", "content": reordered, "category": "news"},
+        {"url": "https://andina.pe/copia", "content": near_copy, "category": "news"},
+    ]
+    rng = random.Random(11)
+    vocabulary = [f"palabra{idx}" for idx in range(500)]
+    for idx in range(total - len(items)):
+        filler = " ".join(rng.choice(vocabulary) for _ in range(40))
+        items.append({"url": f"https://andina.pe/relleno{idx}", "content": filler, "category": "news"})
+    return items
+
+
+def _duplicate_pairs(classifier, total):
+    result = classifier.detect_duplicates(_category_items(total))
+    return {(dup["original_url"], dup["duplicate_url"]) for dup in result["duplicates"]}
+
+
+@pytest.fixture
+def classifier(tmp_path):
+    return URLClassifier({"cache_dir": str(tmp_path)})
+
+
+def test_pair_classification_does_not_depend_on_category_size(classifier):
+    below = _duplicate_pairs(classifier, VECTORIZE_MIN_ITEMS - 1)
+    at_threshold = _duplicate_pairs(classifier, VECTORIZE_MIN_ITEMS)
+
+    assert below == at_threshold
+    assert ("https://andina.pe/original", "https://andina.pe/copia") in below
+    # El reordenamiento se parece por n-gramas, pero no por similitud de edición
+    assert not any(duplicate == "https://andina.pe/reordenada" for _, duplicate in below)
+
+
+def test_reported_similarity_matches_calculate_similarity(classifier):
+    result = classifier.detect_duplicates(_category_items(VECTORIZE_MIN_ITEMS))
+    contents = {item["url"]: item["content"] for item in _category_items(VECTORIZE_MIN_ITEMS)}
+    for duplicate in result["duplicates"]:
+        expected = classifier.calculate_similarity(
+            contents[duplicate["original_url"]], contents[duplicate["duplicate_url"]]
+        )
+        assert duplicate["similarity"] == pytest.approx(expected)
+
+
+def _moved_word_items():
+    """Un original, una copia con una palabra movida al principio y una copia casi idéntica."""
+    original = " ".join(SENTENCES)
+    words = original.split()
+    moved = " ".join(words[6:7] + words[:6] + words[7:])
+    near_copy = original.replace("treinta", "cuarenta")
+    return [
+        {"url": "https://andina.pe/original", "content": original, "category": "news"},
+        {"url": "https://andina.pe/movida", "content": moved, "category": "news"},
+        {"url": "https://andina.pe/copia", "content": near_copy, "category": "news"},
+    ]
+
+
+@pytest.mark.parametrize("use_rapidfuzz", [False, True])
+def test_decisions_do_not_depend_on_rapidfuzz(classifier, monkeypatch, use_rapidfuzz):
+    if use_rapidfuzz and not url_classifier.RAPIDFUZZ_AVAILABLE:
+        pytest.skip("rapidfuzz no está instalado")
+    monkeypatch.setattr(url_classifier, "RAPIDFUZZ_AVAILABLE", use_rapidfuzz)
+
+    items = _moved_word_items()
+    result = classifier.detect_duplicates(items)
+    pairs = {(dup["original_url"], dup["duplicate_url"]) for dup in result["duplicates"]}
+
+    # La palabra movida apenas cambia la similitud Indel, pero sí el ratio de difflib
+    # (autojunk), que es el que decide
+    assert pairs == {("https://andina.pe/original", "https://andina.pe/copia")}
+    original = classifier._normalize_content(items[0]["content"])
+    for item in items:
+        normalized = classifier._normalize_content(item["content"])
+        assert classifier.calculate_similarity(normalized, original, normalize=False) == pytest.approx(
+            SequenceMatcher(None, normalized, original).ratio()
+        )
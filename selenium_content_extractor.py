@@ -31,16 +31,19 @@ class SeleniumContentExtractor:
     Implementa métodos específicos para diferentes tipos de URLs.
     """
     
-    def __init__(self, cache_dir='cache/selenium', headless=True):
+    def __init__(self, cache_dir='cache/selenium', headless=True, reuse_driver=False):
         """
         Inicializar extractor con configuración básica.
         
         Args:
             cache_dir: Directorio para almacenar caché de extracción
             headless: Si ejecutar Chrome en modo headless
+            reuse_driver: Si mantener Chrome abierto entre extracciones (cerrar con close())
         """
         self.cache_dir = cache_dir
         self.headless = headless
+        self.reuse_driver = reuse_driver
+        self._driver = None
         
         # Crear directorio de caché si no existe
         if not os.path.exists(cache_dir):
@@ -137,24 +140,10 @@ class SeleniumContentExtractor:
         
         logger.info(f"Extrayendo contenido de URL: {url} (tipo: {url_type})")
         
-        # Inicializar driver
+        # Inicializar driver (o reutilizar el que ya está abierto)
         driver = None
         try:
-            # Configurar opciones de Chrome
-            chrome_options = Options()
-            if self.headless:
-                chrome_options.add_argument('--headless=new')
-            chrome_options.add_argument('--disable-notifications')
-            chrome_options.add_argument('--disable-infobars')
-            chrome_options.add_argument('--mute-audio')
-            chrome_options.add_argument('--disable-extensions')
-            chrome_options.add_argument('--disable-popup-blocking')
-            chrome_options.add_argument('--no-sandbox')
-            chrome_options.add_argument('--disable-dev-shm-usage')
-            
-            # Iniciar driver
-            driver = webdriver.Chrome(options=chrome_options)
-            driver.set_page_load_timeout(30)  # 30 segundos de timeout
+            driver = self._get_driver()
             
             # Navegar a la URL
             driver.get(url)
@@ -181,6 +170,9 @@ class SeleniumContentExtractor:
         
         except Exception as e:
             logger.error(f"Error extrayendo contenido de {url}: {e}")
+            # Un driver que falló no se reutiliza
+            if isinstance(e, WebDriverException):
+                self.close()
             return {
                 "url": url,
                 "type": url_type,
@@ -190,13 +182,63 @@ class SeleniumContentExtractor:
             }
         
         finally:
-            # Cerrar driver
-            if driver:
+            # Cerrar driver salvo que se mantenga para reutilizarlo
+            if driver and not self.reuse_driver:
                 try:
                     driver.quit()
                 except:
                     pass
     
+    def _get_driver(self):
+        """
+        Crea un driver de Chrome configurado, o retorna el ya abierto si reuse_driver=True.
+        """
+        if self.reuse_driver and self._driver is not None:
+            return self._driver
+        
+        # Configurar opciones de Chrome
+        chrome_options = Options()
+        if self.headless:
+            chrome_options.add_argument('--headless=new')
+        chrome_options.add_argument('--disable-notifications')
+        chrome_options.add_argument('--disable-infobars')
+        chrome_options.add_argument('--mute-audio')
+        chrome_options.add_argument('--disable-extensions')
+        chrome_options.add_argument('--disable-popup-blocking')
+        chrome_options.add_argument('--no-sandbox')
+        chrome_options.add_argument('--disable-dev-shm-usage')
+        
+        # Iniciar driver
+        driver = webdriver.Chrome(options=chrome_options)
+        driver.set_page_load_timeout(30)  # 30 segundos de timeout
+        
+        if self.reuse_driver:
+            self._driver = driver
+        return driver
+    
+    def reset_state(self):
+        """
+        Deja el driver reutilizable en estado limpio (about:blank, sin cookies)
+        antes de devolverlo a un pool.
+        """
+        if self._driver is None:
+            return
+        try:
+            self._driver.get("about:blank")
+            self._driver.delete_all_cookies()
+        except WebDriverException as e:
+            logger.warning(f"No se pudo limpiar el driver, se cerrará: {e}")
+            self.close()
+    
+    def close(self):
+        """Cierra el driver reutilizable si está abierto."""
+        if self._driver is not None:
+            try:
+                self._driver.quit()
+            except Exception:
+                pass
+            self._driver = None
+    
     def _categorize_url(self, url):
         """Categoriza una URL basada en su dominio y patrón"""
         url_lower = url.lower()